@@ -7,45 +7,86 @@ __credits__ = ["Frederick Jansson"]
 __version__ = "0.7.0"
 
 import argparse
-import json
+import glob
+import time
 import yaml
 import logging
 import sys
+import io
 import os.path
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from utils import dict_utils
-from converters.sol6_converter import Sol6Converter
+from converters.sol6_converter import Sol6Converter, ConfigLookups
 from converters.sol6_converter_cisco import SOL6ConverterCisco
+from conversion_server import ConversionServer
+import config_cache
+import output_writer
+from stage_profiler import StageProfiler, NULL_PROFILER
+from rule_stats import RuleStatsTable, SORT_KEYS
 from src.sol6_config_default import SOL6ConfigDefault
-import toml
 log = logging.getLogger(__name__)
 
+# The libyaml based loader is a lot faster on large files, but PyYAML isn't always built with it
+try:
+    from yaml import CSafeLoader as TOSCALoader
+except ImportError:
+    from yaml import SafeLoader as TOSCALoader
+YAML_LOADER = TOSCALoader.__name__
+
+# The outcome of converting a single file in batch mode, error is None if it was successful
+# The error is kept as a string so results can be sent back from worker processes
+BatchResult = namedtuple("BatchResult", ["file", "output", "seconds", "error", "backend", "write_seconds"])
+# The JSON backend that wrote the output, and how long writing the JSON and the XML (if any) took
+OutputStats = namedtuple("OutputStats", ["backend", "seconds", "xml_seconds"])
+
+# The SolCon instance of a batch worker process, set up once per process by _init_batch_worker
+_batch_solcon = None
+
 
 class SolCon:
     def __init__(self, internal_run=False, internal_args=None):
-        self.variables = None
-        self.tosca_lines = None
-        self.tosca_vnf = None
-        self.converter = None
-        self.provider = None
-        self.supported_providers = None
-        self.cnfv = None
+        self.set_defaults()
 
         if internal_args and internal_args["e"] is False:
             print("Starting SolCon (v{})...".format(__version__))
 
-        self.desc = "NFVO SOL6 Converter (SolCon): Convert a SOL001 (TOSCA) YAML to SOL006 JSON"
-
-        self.supported_providers = {
-            "cisco": SOL6ConverterCisco,
-            "mavenir": SOL6ConverterCisco
-        }
-
         parser = argparse.ArgumentParser(description=self.desc)
         parser.add_argument('-f', '--file',
                             help="The TOSCA VNF YAML file to be processed")
+        parser.add_argument('-b', '--batch',
+                            help="A directory or glob of TOSCA VNF YAML files to be processed in one run, "
+                                 "one JSON file is written per input")
+        parser.add_argument('-j', '--jobs', type=int, default=1,
+                            help="The number of processes to convert files with in batch mode, "
+                                 "0 uses one per CPU core")
+        parser.add_argument('--serve', type=int, metavar='PORT',
+                            help="Run as a local server on the given port, TOSCA YAML posted to /convert "
+                                 "is returned as SOL6 JSON")
         parser.add_argument('-o', '--output',
                             help="The output file for the convtered VNF (JSON format), "
-                                 "outputs to stdout if not specified")
+                                 "outputs to stdout if not specified. In batch mode this is the output "
+                                 "directory, the JSON files are written next to the inputs if not specified")
+        parser.add_argument('--compact', action='store_true',
+                            help="Write the JSON without any indentation or whitespace")
+        parser.add_argument('--json-backend', choices=['auto'] + list(output_writer.JSON_BACKENDS.keys()),
+                            default='auto',
+                            help="The JSON encoder to write the output with, 'auto' uses the fastest one "
+                                 "that is installed")
+        parser.add_argument('--xml', action='store_true',
+                            help="Also write the output as XML that can be loaded into NSO, next to the "
+                                 "JSON output file")
+        parser.add_argument('--timings', nargs='?', const='', metavar='REPORT',
+                            help="Time the stages of the conversion (wall time, calls and peak memory) and "
+                                 "print them at the end, the report is also written to REPORT as JSON if given")
+        parser.add_argument('--profile', metavar='PSTATS',
+                            help="Run the conversion under cProfile and write the stats to PSTATS, "
+                                 "the stage timings are printed as with --timings")
+        parser.add_argument('--rule-stats', nargs='?', const='total', choices=list(SORT_KEYS.keys()),
+                            metavar='SORT',
+                            help="Record the values looked up, written and skipped and the time taken by each "
+                                 "mapping rule, and print them at the end sorted by SORT (default total), one of: "
+                                 "{}".format(", ".join(SORT_KEYS.keys())))
         parser.add_argument('-l', '--log-level',
                             choices=['DEBUG', 'INFO', 'WARNING'], default=logging.INFO,
                             help="Set the log level for standalone logging")
@@ -56,6 +97,9 @@ class SolCon:
         parser.add_argument('-s', '--path-config-sol6',
                             help='Location of the paths configuration file for SOL6 paths (OPTIONAL) '
                                  '(TOML format)')
+        parser.add_argument('--no-config-cache', dest='config_cache', action='store_false',
+                            help='Do not read or write the cache of the resolved configs, '
+                                 'which is kept next to the --path-config file')
         parser.add_argument('-r', '--provider',
                             help='Specifically provide the provider instead of trying to read '
                                  'it from the file. Supported providers: {}'
@@ -78,6 +122,10 @@ class SolCon:
             args.provider = internal_args["r"]
             args.log_level = internal_args["l"]
             args.output_silent = internal_args["e"]
+            if "b" in internal_args:
+                args.batch = internal_args["b"]
+            if "j" in internal_args:
+                args.jobs = internal_args["j"]
 
         self.args = args
         self.parser = parser
@@ -86,8 +134,9 @@ class SolCon:
             self.interactive_mode()
             return
 
-        if not args.file or not args.path_config:
-            print("error: the following arguments are required: -f/--file, -c/--path-config")
+        if not (args.file or args.batch or args.serve) or not args.path_config:
+            print("error: the following arguments are required: -f/--file (or -b/--batch or --serve), "
+                  "-c/--path-config")
             return
 
         sol6_config_isfile = True
@@ -98,17 +147,108 @@ class SolCon:
         # Initialize the log and have the level set properly
         setup_logger(args.log_level)
 
-        # Read the configs
-        self.variables = self.read_configs(args.path_config, args.path_config_sol6, sol6_config_isfile)
+        if args.timings is not None or args.profile:
+            self.profiler = StageProfiler(profile_file=args.profile)
+            self.profiler.start()
+        if args.rule_stats:
+            self.rule_stats = RuleStatsTable()
+        try:
+            self.run(sol6_config_isfile)
+        finally:
+            self.finish_profiling()
+
+    def run(self, sol6_config_isfile=True):
+        args = self.args
+        # Read the configs, this is only done once even when converting multiple files
+        with self.profiler.stage("read_configs"):
+            self.variables = self.read_configs(args.path_config, args.path_config_sol6, sol6_config_isfile,
+                                               use_cache=args.config_cache)
 
-        # Parse the yang specifications file into an empty dictionary
-        self.parsed_dict = {}
+        if args.serve:
+            self.serve(args.serve)
+            return
+
+        if args.batch:
+            self.batch_results = self.run_batch(args.batch, args.output, jobs=args.jobs)
+            return
+
+        self.cnfv = self.convert_file(args.file, args.provider)
+
+        self.output()
+
+    def finish_profiling(self):
+        """
+        Stop the profiler, print the stage timings and rule stats and write the JSON report if one
+        was asked for
+        """
+        if self.rule_stats is not None:
+            print(self.rule_stats.table(self.args.rule_stats), file=sys.stderr)
+        if not self.profiler.enabled:
+            return
+        self.profiler.stop()
+        print(self.profiler.summary(), file=sys.stderr)
+        if self.args.timings:
+            stats = self.output_stats
+            info = {}
+            if self.rule_stats is not None:
+                info["rules"] = self.rule_stats.as_list()
+            self.profiler.write_report(self.args.timings, file=self.args.file or self.args.batch,
+                                       provider=self.provider, yaml_loader=YAML_LOADER,
+                                       json_backend=stats.backend if stats else None, **info)
+
+    def set_defaults(self):
+        self.variables = None
+        self.tosca_vnf = None
+        self.converter = None
+        self.provider = None
+        self.cnfv = None
+        self.batch_results = None
+        self.output_stats = None
+        self.profiler = NULL_PROFILER
+        self.rule_stats = None
+        self.config_lookups = None
+
+        self.desc = "NFVO SOL6 Converter (SolCon): Convert a SOL001 (TOSCA) YAML to SOL006 JSON"
 
+        self.supported_providers = {
+            "cisco": SOL6ConverterCisco,
+            "mavenir": SOL6ConverterCisco
+        }
+
+    @classmethod
+    def prepared(cls, args, variables):
+        """
+        Create a SolCon from already parsed arguments and configs without running anything,
+        used to convert files in other processes
+        """
+        solcon = cls.__new__(cls)
+        solcon.set_defaults()
+        solcon.args = args
+        solcon.parser = None
+        solcon.variables = variables
+        return solcon
+
+    def convert_file(self, file, arg_provider=None):
+        """
+        Convert a single TOSCA file with the configs that have already been read
+        :return: The converted SOL6 dict
+        """
         # Read the data from the provided yaml file into variables
-        self.tosca_vnf, self.tosca_lines = self.read_tosca_yaml(args.file)
+        with self.profiler.stage("read_tosca_yaml"):
+            self.tosca_vnf = self.read_tosca_yaml(file)
+
+        return self.convert_tosca(arg_provider)
+
+    def convert_tosca(self, arg_provider=None):
+        """
+        Convert the TOSCA that has already been read into self.tosca_vnf
+        :return: The converted SOL6 dict
+        """
+        # Parse the yang specifications file into an empty dictionary
+        self.parsed_dict = {}
 
         # Determine what provider to use
-        self.provider = self.find_provider(args.provider, self.tosca_lines,
+        self.provider = self.find_provider(arg_provider, self.tosca_vnf,
                                            self.supported_providers)
         if self.provider is None:
             raise ValueError("The TOSCA provider could not be automatically found, pass it in"
@@ -119,68 +259,246 @@ class SolCon:
         self.converter = self.initialize_converter(self.provider, self.supported_providers)
 
         # Try to convert variables to their actual values
-        self.converter.convert_variables()
+        with self.profiler.stage("convert_variables"):
+            self.converter.convert_variables()
 
         # Do the actual converting logic
-        self.cnfv = self.converter.convert(provider=self.provider)
+        return self.converter.convert(provider=self.provider)
 
-        self.output()
+    def run_batch(self, batch, output_dir=None, jobs=1):
+        """
+        Convert every file matched by batch (a directory or a glob pattern), reusing the configs
+        that were read once for the whole run.
+        If jobs is more than 1 the files are spread over that many processes
+        :return: A list of BatchResult, in the same order as the input files
+        """
+        files = self.find_batch_files(batch)
+        if not files:
+            log.error("No TOSCA files found for '{}'".format(batch))
+            return []
+        # The directories of the files are kept under output_dir, from the directory they have in common
+        base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files])
+        out_files = [self.batch_output_path(file, output_dir, base_dir=base_dir) for file in files]
+        duplicates = self.find_duplicate_outputs(files, out_files)
+        if duplicates:
+            # Nothing is converted, the files would overwrite each other
+            for file, out_file, other in duplicates:
+                log.error("{} and {} would both be written to {}".format(other, file, out_file))
+            errors = {file: "Output {} is also the output of {}".format(out_file, other)
+                      for file, out_file, other in duplicates}
+            results = [BatchResult(file, out_file, 0.0,
+                                   errors.get(file, "Not converted, the batch has duplicate outputs"), None, None)
+                       for file, out_file in zip(files, out_files)]
+            self.print_batch_summary(results, 0.0)
+            return results
+
+        if jobs is not None and jobs < 1:
+            jobs = os.cpu_count() or 1
+        jobs = min(jobs or 1, len(files))
+
+        start = time.perf_counter()
+        if jobs > 1:
+            if self.profiler.enabled or self.rule_stats is not None:
+                log.warning("The timings and rule stats only cover the main process, the conversions in the other "
+                            "processes are not included")
+            log.info("Converting {} files with {} processes".format(len(files), jobs))
+            # The variables are sent to each worker once, instead of with every file
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker,
+                                     initargs=(self.args, self.variables)) as executor:
+                # map keeps the results in the order of the input files
+                results = list(executor.map(_convert_batch_file, files, out_files))
+        else:
+            results = [self.convert_batch_file(file, out_file) for file, out_file in zip(files, out_files)]
+
+        self.print_batch_summary(results, time.perf_counter() - start)
+        return results
+
+    def convert_batch_file(self, file, out_file):
+        """
+        Convert and write a single file of a batch, errors are logged and returned instead of raised
+        so that one broken VNFD does not stop the rest of the batch
+        """
+        start = time.perf_counter()
+        error = None
+        self.output_stats = None
+        try:
+            self.cnfv = self.convert_file(file, self.args.provider)
+            self.output(out_file)
+        except Exception as e:
+            log.error("Could not convert {}: {}".format(file, e))
+            error = str(e) or type(e).__name__
+        stats = self.output_stats
+        return BatchResult(file, out_file, time.perf_counter() - start, error,
+                           stats.backend if stats else None,
+                           stats.seconds + stats.xml_seconds if stats else None)
 
     @staticmethod
-    def read_configs(tosca_config, sol6_config, sol6_is_file=True):
-        # Read the path configuration file
-        variables = toml.load(tosca_config)
-        if sol6_is_file:
-            variables_sol6 = toml.load(sol6_config)
+    def find_batch_files(batch):
+        """
+        If batch is a directory return all the yaml files in it, otherwise treat it as a glob
+        """
+        if os.path.isdir(batch):
+            files = glob.glob(os.path.join(batch, "*.yaml")) + glob.glob(os.path.join(batch, "*.yml"))
         else:
-            variables_sol6 = toml.loads(sol6_config)
+            files = glob.glob(batch)
+        return sorted(f for f in files if os.path.isfile(f))
 
-        return dict_utils.merge_two_dicts(variables, variables_sol6)
+    @staticmethod
+    def batch_output_path(file, output_dir=None, base_dir=None):
+        """
+        The JSON output goes into output_dir if it is set, otherwise next to the input file
+        :param base_dir: The directory of the file relative to base_dir is kept under output_dir,
+                         so files with the same name in different directories don't overwrite each other
+        """
+        name = "{}.json".format(os.path.splitext(os.path.basename(file))[0])
+        if not output_dir:
+            return os.path.join(os.path.dirname(file), name)
+        if base_dir:
+            rel_dir = os.path.relpath(os.path.dirname(os.path.abspath(file)), base_dir)
+            output_dir = os.path.normpath(os.path.join(output_dir, rel_dir))
+        return os.path.join(output_dir, name)
 
-    def output(self):
-        # Prune the empty fields
-        if self.args.prune:
-            self.cnfv = dict_utils.remove_empty_from_dict(self.cnfv)
-        # Put the data:esti-nfv:vnf tags at the base
-        cnfv = {'data': {'etsi-nfv-descriptors:nfv': self.cnfv}}
+    @staticmethod
+    def find_duplicate_outputs(files, out_files):
+        """
+        Files that have the same output path as a file before them, i.e. vnfd.yaml and vnfd.yml
+        :return: A list of (file, output path, the file before it with that output)
+        """
+        seen = {}
+        duplicates = []
+        for file, out_file in zip(files, out_files):
+            key = os.path.normcase(os.path.abspath(out_file))
+            if key in seen:
+                duplicates.append((file, out_file, seen[key]))
+            else:
+                seen[key] = file
+        return duplicates
+
+    @staticmethod
+    def print_batch_summary(results, elapsed):
+        converted = len([r for r in results if r.error is None])
+        backends = sorted(set(r.backend for r in results if r.backend))
+        write_seconds = sum(r.write_seconds for r in results if r.write_seconds is not None)
+        print("Batch summary: {}/{} converted in {:.3f}s, {:.3f}s writing output (YAML loader: {}, JSON backend: {})"
+              .format(converted, len(results), elapsed, write_seconds, YAML_LOADER, ", ".join(backends) or "-"))
+        for r in results:
+            if r.error is None:
+                print("  OK    {:8.3f}s  (write {:.3f}s)  {} -> {}".format(r.seconds, r.write_seconds, r.file, r.output))
+            else:
+                # Parser errors can span several lines, the first one is enough for a summary
+                print("  FAIL  {:8.3f}s  {}: {}".format(r.seconds, r.file, r.error.splitlines()[0]))
 
-        json_output = json.dumps(cnfv, indent=2)
+    @staticmethod
+    def read_configs(tosca_config, sol6_config, sol6_is_file=True, use_cache=True):
+        """
+        Read the path configuration files, the paths in them are already resolved
+        The result is cached next to tosca_config until either of the configs change
+        """
+        return config_cache.load_variables(tosca_config, sol6_config, sol6_is_file, use_cache=use_cache)
 
-        # Get the absolute path, since apparently relative paths sometimes have issues with things?
-        if self.args.output:
-            abs_path = os.path.abspath(self.args.output)
-            # Also python has a function for what I was sloppily doing, so use that
-            abs_dir = os.path.dirname(abs_path)
-            if not os.path.exists(abs_dir):
-                os.makedirs(abs_dir, exist_ok=True)
+    def output(self, output_file=None):
+        """
+        Write the converted dict out, to output_file if it's given, otherwise to the output argument
+        The backend and the time it took are kept in output_stats
+        """
+        if output_file is None:
+            output_file = self.args.output
+        with self.profiler.stage("output"):
+            cnfv = self.format_output()
+            backend = output_writer.get_json_backend(self.args.json_backend)
+
+            start = time.perf_counter()
+            used = None
+            with self.profiler.stage("serialize"):
+                if output_file:
+                    used = output_writer.write_json_file(cnfv, output_file, compact=self.args.compact,
+                                                         backend=backend)
+                elif not self.args.output_silent:
+                    used = self.write_stdout(cnfv, backend)
+            seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if self.args.xml:
+                if output_file:
+                    with self.profiler.stage("xml"):
+                        output_writer.write_xml_file(cnfv, output_writer.xml_output_path(output_file),
+                                                     namespaces=self.variables.get("xml_namespaces"))
+                else:
+                    log.warning("--xml is only written next to an output file, use -o")
+            xml_seconds = time.perf_counter() - start
 
-            with open(self.args.output, 'w') as f:
-                f.writelines(json_output)
+        self.output_stats = OutputStats(used, seconds, xml_seconds)
+        if used:
+            log.info("Wrote the output with {} in {:.3f}s".format(used, seconds))
 
-        if not self.args.output and not self.args.output_silent:
-            sys.stdout.write(json_output)
+    def write_stdout(self, cnfv, backend):
+        """
+        Write the JSON to stdout, as bytes when it has a binary buffer
+        :return: The name of the backend that wrote it
+        """
+        sys.stdout.flush()
+        buffer = getattr(sys.stdout, "buffer", None)
+        if buffer is None:
+            # A text stream, i.e. redirected to a StringIO
+            f = io.BytesIO()
+            used = output_writer.write_json(cnfv, f, compact=self.args.compact, backend=backend)
+            sys.stdout.write(f.getvalue().decode("utf-8"))
+            return used
+        used = output_writer.write_json(cnfv, buffer, compact=self.args.compact, backend=backend)
+        buffer.flush()
+        return used
+
+    def format_output(self):
+        """
+        Prune the converted dict if needed and put it under the top level tags
+        """
+        # Prune the empty fields
+        if self.args.prune:
+            with self.profiler.stage("prune"):
+                self.cnfv = dict_utils.remove_empty_from_dict(self.cnfv)
+        # Put the data:esti-nfv:vnf tags at the base
+        return {'data': {'etsi-nfv-descriptors:nfv': self.cnfv}}
 
     def read_tosca_yaml(self, file):
         # Read the tosca vnf into a dict from yaml format
-        log.info("Reading TOSCA YAML file {}".format(file))
-        f = open(file, 'rb')
-        file_read = f.read()
-        f.close()
-        f = open(file, 'rb')
-        file_lines = f.readlines()
-        f.close()
-        parsed_yaml = yaml.safe_load(file_read)
+        # The file is only read once, everything after this works from the parsed dict
+        log.info("Reading TOSCA YAML file {} with {}".format(file, YAML_LOADER))
+        with open(file, 'rb') as f:
+            return yaml.load(f, Loader=TOSCALoader)
 
-        return parsed_yaml, file_lines
+    @staticmethod
+    def parse_tosca_yaml(data):
+        """
+        Same as read_tosca_yaml, but for TOSCA that has already been read into memory
+        """
+        return yaml.load(data, Loader=TOSCALoader)
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Keep the configs and converters loaded and convert the TOSCA posted over HTTP until interrupted
+        """
+        server = ConversionServer((host, port), self)
+        print("Serving SolCon on http://{}:{}/convert".format(*server.server_address[:2]))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
 
     def initialize_converter(self, sel_provider, valid_providers):
         # We found a proper provider, so we can start doing things
         log.info("Starting conversion with provider '{}'".format(sel_provider))
-        return valid_providers[sel_provider](self.tosca_vnf, self.parsed_dict,
-                                             variables=self.variables)
+        # The converters copy the part of the variables they write to, and what they build from the
+        # configs is shared between the files converted with the same variables
+        if self.config_lookups is None or self.config_lookups.variables is not self.variables:
+            self.config_lookups = ConfigLookups(self.variables)
+        return valid_providers[sel_provider](self.tosca_vnf, self.parsed_dict, variables=self.variables,
+                                             profiler=self.profiler, rule_stats=self.rule_stats,
+                                             lookups=self.config_lookups)
 
     @staticmethod
-    def find_provider(arg_provider, file_lines, valid_providers):
+    def find_provider(arg_provider, tosca_vnf, valid_providers):
         # Figure out what class we want to use
         # If it was specifically provided as a parameter
         if arg_provider:
@@ -188,7 +506,7 @@ class SolCon:
         else:
             # Try to figure out what it is
 
-            sel_provider = "-".join(Sol6Converter.find_provider(file_lines).split(" "))
+            sel_provider = "-".join(Sol6Converter.find_provider(tosca_vnf).split(" "))
 
             # If the provider is not a part of a valid provider, i.e. 'cisco' in ['cisco'],
             # check if any of the valid providers are in the sel_provider,
@@ -275,7 +593,7 @@ class SolCon:
             opt = self.valid_input("OK? (y/n)", yn)
             if opt == "y":
                 break
-        self.tosca_vnf, self.tosca_lines = self.read_tosca_yaml(tosca_file)
+        self.tosca_vnf = self.read_tosca_yaml(tosca_file)
 
         # ** Output to a file (or not) **
         file_out = args.output
@@ -302,7 +620,7 @@ class SolCon:
             if not args.provider:
                 found_prov = None
                 try:
-                    found_prov = self.find_provider(None, self.tosca_lines,
+                    found_prov = self.find_provider(None, self.tosca_vnf,
                                                     self.supported_providers)
                 except KeyError:
                     pass
@@ -327,9 +645,9 @@ class SolCon:
         self.converter = self.initialize_converter(self.provider, self.supported_providers)
 
         # ** o the actual converting logic **
-        cnfv = self.converter.convert(provider=self.provider)
+        self.cnfv = self.converter.convert(provider=self.provider)
 
-        self.output(cnfv)
+        self.output()
 
     @staticmethod
     def valid_input_file(prompt):
@@ -360,6 +678,18 @@ class SolCon:
                 return opts[opts_l.index(choice.lower())]
 
 
+def _init_batch_worker(args, variables):
+    global _batch_solcon
+    # Forked workers already have the logging set up from the parent process
+    if not logging.getLogger().handlers:
+        setup_logger(args.log_level)
+    _batch_solcon = SolCon.prepared(args, variables)
+
+
+def _convert_batch_file(file, out_file):
+    return _batch_solcon.convert_batch_file(file, out_file)
+
+
 def setup_logger(log_level=logging.INFO):
     log_format = "%(levelname)s - %(message)s"
     log_folder = "logs"
@@ -377,4 +707,7 @@ def setup_logger(log_level=logging.INFO):
 
 
 if __name__ == '__main__':
-    SolCon()
+    solcon = SolCon()
+    # Let scripts know if any of the files in a batch failed
+    if solcon.batch_results and any(r.error is not None for r in solcon.batch_results):
+        sys.exit(1)
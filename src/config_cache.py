@@ -0,0 +1,121 @@
+"""
+Cache of the config files with their paths already resolved.
+Reading the TOML and resolving every path is the same work for every run with the same configs,
+so the result is pickled next to the TOSCA config, and only redone when either config changes.
+"""
+import os
+import sys
+import pickle
+import hashlib
+import logging
+import toml
+from functools import lru_cache
+from keys.sol6_keys import PathMaping
+from utils.dict_utils import merge_two_dicts
+log = logging.getLogger(__name__)
+
+# Increase this when the structure of the cached variables changes, so old caches are not used
+CACHE_VERSION = 1
+CACHE_EXTENSION = ".cache"
+# The modules whose code decides what the resolved variables are, their source is part of the cache key
+# so changing how the paths are resolved doesn't load caches made by the old code
+RESOLVER_MODULES = (__name__, PathMaping.__module__, merge_two_dicts.__module__)
+
+
+def load_variables(tosca_config, sol6_config, sol6_is_file=True, use_cache=True):
+    """
+    Read both configs and return the merged variables, with the 'tosca' and 'sol6' paths resolved
+    :param sol6_config: A file name, or the config itself if sol6_is_file is False
+    :param use_cache: Read and write the cache file, it is kept next to tosca_config
+    """
+    with open(tosca_config, 'rb') as f:
+        tosca_data = f.read()
+    if sol6_is_file:
+        with open(sol6_config, 'rb') as f:
+            sol6_data = f.read()
+    else:
+        sol6_data = sol6_config.encode("utf-8")
+
+    key = cache_key(tosca_data, sol6_data)
+    cache_file = cache_path(tosca_config)
+    if use_cache:
+        variables = read_cache(cache_file, key)
+        if variables is not None:
+            log.debug("Using the cached configs in {}".format(cache_file))
+            return variables
+
+    variables = merge_two_dicts(toml.loads(tosca_data.decode("utf-8")), toml.loads(sol6_data.decode("utf-8")))
+    variables = PathMaping.format_paths(variables)
+
+    if use_cache:
+        write_cache(cache_file, key, variables)
+    return variables
+
+
+def cache_key(tosca_data, sol6_data):
+    h = hashlib.sha256()
+    h.update("v{}".format(CACHE_VERSION).encode("utf-8"))
+    h.update(resolver_version().encode("utf-8"))
+    # Hash the lengths too, so the boundary between the files can't shift
+    for data in (tosca_data, sol6_data):
+        h.update(str(len(data)).encode("utf-8"))
+        h.update(data)
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def resolver_version():
+    """
+    A hash of the source of RESOLVER_MODULES, only read once per process
+    """
+    h = hashlib.sha256()
+    for name in RESOLVER_MODULES:
+        h.update(name.encode("utf-8"))
+        source_file = getattr(sys.modules.get(name), "__file__", None)
+        try:
+            with open(source_file, 'rb') as f:
+                h.update(f.read())
+        except (OSError, TypeError):
+            # Without the source there's nothing to compare, CACHE_VERSION still applies
+            log.debug("Could not read the source of {} for the config cache key".format(name))
+    return h.hexdigest()
+
+
+def cache_path(tosca_config):
+    return "{}{}".format(os.path.abspath(tosca_config), CACHE_EXTENSION)
+
+
+def read_cache(cache_file, key):
+    """
+    Return the cached variables if the cache exists and is for the same configs, otherwise None
+    """
+    try:
+        with open(cache_file, 'rb') as f:
+            cached = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.debug("Could not read the config cache {}: {}".format(cache_file, e))
+        return None
+
+    if not isinstance(cached, dict) or cached.get("key") != key:
+        return None
+    return cached.get("variables")
+
+
+def write_cache(cache_file, key, variables):
+    """
+    Write the cache, failing to do so is not an error, the configs just get read again next time
+    """
+    tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+    try:
+        with open(tmp_file, 'wb') as f:
+            pickle.dump({"key": key, "variables": variables}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Replace it in one go so other processes never read a partial cache
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        log.debug("Could not write the config cache {}: {}".format(cache_file, e))
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
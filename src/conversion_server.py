@@ -0,0 +1,160 @@
+"""
+Local HTTP server that keeps the configs and converters loaded between conversions,
+so callers don't pay for the interpreter startup and config parsing on every VNFD
+"""
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from urllib.request import Request, urlopen
+log = logging.getLogger(__name__)
+
+LATENCY_HEADER = "X-SolCon-Latency-Ms"
+# How many parsed TOSCA documents are kept. They can be converted again, the converters write the values
+# they derive from the TOSCA to a CowTree over it instead of the parsed document
+PARSE_CACHE_SIZE = 16
+
+
+class ServerMetrics:
+    """
+    Request counts and conversion latencies since the server was started
+    """
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+        self.last_ms = None
+        self.parse_cache_hits = 0
+
+    def record(self, latency_ms, error=False):
+        self.requests += 1
+        if error:
+            self.errors += 1
+        self.total_ms += latency_ms
+        self.last_ms = latency_ms
+        self.min_ms = latency_ms if self.min_ms is None else min(self.min_ms, latency_ms)
+        self.max_ms = latency_ms if self.max_ms is None else max(self.max_ms, latency_ms)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.requests, 3) if self.requests else None,
+            "min_ms": self.min_ms,
+            "max_ms": self.max_ms,
+            "last_ms": self.last_ms,
+            "parse_cache_hits": self.parse_cache_hits
+        }
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """
+    POST /convert[?provider=name] with the TOSCA YAML as the body returns the SOL6 JSON
+    GET /metrics returns the ServerMetrics
+    """
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/convert":
+            self._send_json(404, {"error": "Unknown path {}".format(url.path)})
+            return
+
+        provider = parse_qs(url.query).get("provider", [None])[0]
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        start = time.perf_counter()
+        try:
+            output = self.server.convert(body, provider)
+            status = 200
+        except Exception as e:
+            log.error("Could not convert the posted TOSCA: {}".format(e))
+            output = {"error": str(e) or type(e).__name__}
+            status = 400
+        latency_ms = round((time.perf_counter() - start) * 1000, 3)
+        self.server.metrics.record(latency_ms, error=status != 200)
+
+        self._send_json(status, output, latency_ms)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/metrics":
+            self._send_json(404, {"error": "Unknown path {}".format(self.path)})
+            return
+        self._send_json(200, self.server.metrics.as_dict())
+
+    def _send_json(self, status, content, latency_ms=None):
+        data = json.dumps(content, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if latency_ms is not None:
+            self.send_header(LATENCY_HEADER, str(latency_ms))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        log.debug("{} - {}".format(self.address_string(), fmt % args))
+
+
+class ConversionServer(HTTPServer):
+    """
+    Serves conversions with a SolCon that already has its configs read.
+    Requests are handled one at a time, the converters are not thread safe.
+    The last parse_cache_size distinct TOSCA documents are kept parsed, so posting the same one
+    again skips parsing the YAML.
+    """
+    def __init__(self, server_address, solcon, parse_cache_size=PARSE_CACHE_SIZE):
+        super().__init__(server_address, ConversionHandler)
+        self.solcon = solcon
+        self.metrics = ServerMetrics()
+        self.parse_cache_size = parse_cache_size
+        self.parsed = OrderedDict()
+
+    def convert(self, tosca_data, provider=None):
+        """
+        Convert TOSCA YAML bytes, returns the same dict that would be written to the output file
+        """
+        solcon = self.solcon
+        solcon.tosca_vnf = self.parse(tosca_data)
+        solcon.cnfv = solcon.convert_tosca(provider or solcon.args.provider)
+        return solcon.format_output()
+
+    def parse(self, tosca_data):
+        """
+        Parse the TOSCA YAML, or get it from the cache if the same document was posted before
+        """
+        key = hashlib.sha256(tosca_data).hexdigest()
+        if key in self.parsed:
+            self.parsed.move_to_end(key)
+            self.metrics.parse_cache_hits += 1
+            return self.parsed[key]
+
+        tosca_vnf = self.solcon.parse_tosca_yaml(tosca_data)
+        if self.parse_cache_size > 0:
+            self.parsed[key] = tosca_vnf
+            while len(self.parsed) > self.parse_cache_size:
+                self.parsed.popitem(last=False)
+        return tosca_vnf
+
+
+def request_conversion(url, tosca_data, provider=None, timeout=60):
+    """
+    Minimal client for ConversionServer
+    :param url: The base url of the server, i.e. http://127.0.0.1:8765
+    :return: A tuple of the converted dict and the latency the server reported in milliseconds
+    """
+    target = "{}/convert".format(url.rstrip("/"))
+    if provider:
+        target = "{}?provider={}".format(target, provider)
+    if isinstance(tosca_data, str):
+        tosca_data = tosca_data.encode("utf-8")
+
+    req = Request(target, data=tosca_data, method="POST",
+                  headers={"Content-Type": "application/x-yaml"})
+    with urlopen(req, timeout=timeout) as response:
+        latency = float(response.headers[LATENCY_HEADER])
+        return json.loads(response.read().decode("utf-8")), latency
@@ -2,48 +2,62 @@
 
 """
 import re
+import time
 from keys.sol6_keys import *
 from utils.dict_utils import *
 from utils.key_utils import KeyUtils
+from valid_values import ValidValues
+from stage_profiler import NULL_PROFILER
 import logging
 log = logging.getLogger(__name__)
 
 
+class ConfigLookups:
+    """
+    What the converters build from the configs that is the same for every file: the flag transforms
+    for each set of rule options and the ValidValues of the lists in the sol6 config.
+    One is shared by every conversion with the same variables, so they are only built once per config
+    """
+    def __init__(self, variables=None):
+        # The variables these were built from
+        self.variables = variables
+        # {(converter class, options): transforms}, see Sol6Converter.build_transforms
+        self.flag_transforms = {}
+        # {(name, fuzzy): ValidValues}, see Sol6Converter.get_valid_values
+        self.valid_values = {}
+
+
 class Sol6Converter:
     tosca_vnf = None
     parsed_dict = None
     vnfd = None
     keys = None
 
-    def __init__(self, tosca_vnf, parsed_dict, variables=None):
-        self.tosca_vnf = tosca_vnf
+    def __init__(self, tosca_vnf, parsed_dict, variables=None, profiler=None, rule_stats=None, lookups=None):
+        # Anything derived from the tosca is written to a copy-on-write layer over it, so the same
+        # parsed tosca can be converted again
+        self.tosca_tree = CowTree(tosca_vnf)
+        self.tosca_vnf = self.tosca_tree.root
         self.parsed_dict = parsed_dict
+        # The variables are shared between conversions, the only part that is written to is the tosca
+        # table (the provider identifiers), so that is the only part that is copied
+        if variables and "tosca" in variables:
+            variables = merge_two_dicts(variables, {"tosca": dict(variables["tosca"])})
         self.variables = variables
 
         # Set this up for _virtual_get_flavor_names
         self.run_deltas = True
         # If we want to hard skip the loop that runs the deltas
         self.override_run_deltas = False
-
-        # Set up the flag variables
-        self.key_as_value       = False
-        self.only_number        = False
-        self.only_number_float  = False
-        self.append_list        = False
-        self.first_list_elem    = False
-        self.tosca_use_value    = False
-        self.format_as_ip       = False
-        self.format_as_disk     = False
-        self.format_as_container = False
-        self.format_as_aff_scope = False
-        self.format_as_storage = False
-        self.format_invalid_none = False
-        self.fail_silent        = False
-        self.req_parent         = False
-        self.first_list_output  = False
-        self.unit_gb            = False
-        self.unit_fractional    = False
-        self.min_1              = False
+        # The merged lists of dicts from reading the tosca, only kept during run_mapping since the
+        # tosca isn't modified then
+        self.merge_cache = None
+        # The flag transforms and ValidValues, shared with the other conversions of the same config
+        self.lookups = lookups or ConfigLookups(variables)
+        # The stages of convert are timed with this, see StageProfiler
+        self.profiler = profiler or NULL_PROFILER
+        # If set, the RuleStatsTable the rules of run_mapping are recorded in
+        self.rule_stats = rule_stats
 
     def convert(self, provider=None):
         """
@@ -69,10 +83,12 @@ class Sol6Converter:
             return
 
         inputs = get_roots_from_filter(self.tosca_vnf, child_value="get_input")
+        tree = self.tosca_tree
 
         for i in inputs:
             # Strip the outer key, we don't need it
-            cur = i[get_dict_key(i)]
+            root_key = get_dict_key(i)
+            cur = i[root_key]
 
             # Now there *should* be at least one {'get_input': ...} under one of the keys in here
             # Try to find that value
@@ -95,40 +111,81 @@ class Sol6Converter:
                     # Overwrite the get_input dict with just the value from the config
                     if k == 'get_input':
                         # We need to overwrite the value of one level above
-                        i[get_dict_key(i)] = defined_vars[var_name]
+                        # The roots of dicts that aren't in a list are {key: dict}, made by
+                        # get_roots_from_filter, so those aren't part of the tosca
+                        if tree.contains(i):
+                            tree.writable(i)[root_key] = defined_vars[var_name]
+                            # cur isn't in the tosca anymore, so nothing else in it can be set
+                            break
                     else:
-                        cur[k] = defined_vars[var_name]
+                        tree.writable(cur)[k] = defined_vars[var_name]
 
     # *************************
     # ** Run Mapping Methods **
     # *************************
     def run_mapping(self, keys):
         """
-        The first parameter is always a tuple, with the flags as the second parameter
-        If there are multiple flags, they will be grouped in a tuple as well
+        Run the rules in the MappingPlan of keys, in order
+        """
+        self.merge_cache = {}
+        try:
+            if self.rule_stats is None:
+                for rule in keys.mapping:
+                    self.run_mapping_map_needed(rule)
+            else:
+                self.run_mapping_stats(keys)
+        finally:
+            self.merge_cache = None
+
+    def run_mapping_stats(self, keys):
+        """
+        Run the rules like run_mapping, recording the RuleStats of each one in rule_stats
+        """
+        for rule in keys.mapping:
+            stats = self.rule_stats.rule(rule)
+            start = time.perf_counter()
+            self.run_mapping_map_needed(rule, stats)
+            stats.seconds += time.perf_counter() - start
+            stats.runs += 1
+
+    def mapped_value(self, f_sol6_path, f_tosca_path, options, stats=None):
+        """
+        The value for a rule after the flags, see handle_flags
+        :param stats: The RuleStats of the rule, if they are being recorded
+        """
+        if stats is None:
+            return self.handle_flags(f_sol6_path, f_tosca_path, options)
+        return stats.time_flags(self.handle_flags, f_sol6_path, f_tosca_path, options)
+
+    def write_value(self, sol6_path, value, stats=None):
+        """
+        Set a mapped value in the vnfd
+        :param stats: The RuleStats of the rule, if they are being recorded
         """
-        for ((tosca_path, flags), map_sol6) in keys.mapping:
-            self.run_mapping_flags(flags, keys)
-            self.run_mapping_map_needed(tosca_path, map_sol6)
+        if stats is None:
+            set_path_to(sol6_path, self.vnfd, value, create_missing=True)
+        else:
+            stats.time_write(set_path_to, sol6_path, self.vnfd, value, create_missing=True)
 
-    def run_mapping_islist(self, tosca_path, map_sol6):
+    def run_mapping_islist(self, rule, stats=None):
         """
         What to do if there is a complex mapping needed
         Called from run_mapping_map_needed
         """
-        mapping_list = map_sol6[1]  # List of MapElems
-        sol6_path = map_sol6[0]
+        tosca_path = rule.tosca_path
+        sol6_path = rule.sol6_path
+        options = rule.options
 
-        for elem in mapping_list:
+        for elem in rule.mapping:
             # Skip this mapping element if it is None, but allow a none name to pass
             if not elem:
                 continue
-            if not elem.parent_map and self.req_parent:
-                if not self.fail_silent:
+            if not elem.parent_map and options.req_parent:
+                if not options.fail_silent:
                     log.warning("Parent mapping is required, but {} does not have one".format(elem))
                 continue
 
-            tosca_use_value = self.tosca_use_value
+            tosca_use_value = options.tosca_use_value
             f_tosca_path = MapElem.format_path(elem, tosca_path, use_value=tosca_use_value)
             f_sol6_path = MapElem.format_path(elem, sol6_path, use_value=True)
 
@@ -136,7 +193,7 @@ class Sol6Converter:
                       .format(f_tosca_path, f_sol6_path))
 
             # Handle flags for mapped values
-            value = self.handle_flags(f_sol6_path, f_tosca_path)
+            value = self.mapped_value(f_sol6_path, f_tosca_path, options, stats)
 
             # If the value doesn't exist, don't write it
             # Do write it if the value is 0, though
@@ -145,169 +202,136 @@ class Sol6Converter:
                 write = True if value is 0 else False
 
             if write:
-                set_path_to(f_sol6_path, self.vnfd, value, create_missing=True)
+                self.write_value(f_sol6_path, value, stats)
 
-    def run_mapping_notlist(self, tosca_path, map_sol6):
+    def run_mapping_notlist(self, rule, stats=None):
         """
         What to do if there is no complex mapping specified
         Called from run_mapping_map_needed
         """
-        sol6_path = map_sol6
+        sol6_path = rule.sol6_path
         if sol6_path is None:
             log.debug("SOL6 path is None, skipping with no error message")
             return
 
         # Handle the various flags for no mappings
-        value = self.handle_flags(sol6_path, tosca_path)
+        value = self.mapped_value(sol6_path, rule.tosca_path, rule.options, stats)
 
-        set_path_to(sol6_path, self.vnfd, value, create_missing=True)
+        self.write_value(sol6_path, value, stats)
 
-    def run_mapping_map_needed(self, tosca_path, map_sol6):
+    def run_mapping_map_needed(self, rule, stats=None):
         """
         Determine if a mapping (list of MapElem) has been specified
         Called by run_mapping
+        :param stats: The RuleStats to record the rule in, if they are being recorded
         """
-        if tosca_path is None:
+        if rule.tosca_path is None:
             log.debug("Tosca path is None, skipping with no error message")
             return
 
-        log.debug("Run mapping for tosca: {} --> sol6: {}"
-                  .format(tosca_path, map_sol6 if not isinstance(map_sol6, list) else map_sol6[0]))
+        log.debug("Run mapping for tosca: {} --> sol6: {}".format(rule.tosca_path, rule.sol6_path))
+        if rule.flags:
+            log.debug("Flags: {}".format(rule.flags))
 
         # Check if there is a mapping needed
-        if isinstance(map_sol6, list):
-            log.debug("\tMapping: {}".format(map_sol6[1]))
-            self.run_mapping_islist(tosca_path, map_sol6)
+        if rule.has_mapping:
+            log.debug("\tMapping: {}".format(rule.mapping))
+            self.run_mapping_islist(rule, stats)
         else:  # No mapping needed
-            self.run_mapping_notlist(tosca_path, map_sol6)
-
-    def run_mapping_flags(self, flags, keys):
-        """
-        Handle various flag operations, such as setting them to false and updating their values
-        Called from run_mapping
-        """
-        self.set_flags_false()
-        self.set_flags_loop(flags, keys)
+            self.run_mapping_notlist(rule, stats)
 
     # ******************
     # ** Flag methods **
     # ******************
-    def handle_flags(self, f_sol6_path, f_tosca_path):
+    def handle_flags(self, f_sol6_path, f_tosca_path, options):
         """
         Returns the value after being formatted by the flags
+        :param options: The decoded flags of the rule, see MappingPlan.decode_flags
         """
+        value = self._key_as_value(options.key_as_value, f_tosca_path,
+                                   fail_silent=options.fail_silent)
+        for transform in self.get_transforms(options):
+            value = transform(self, f_sol6_path, value)
+        return self._check_for_null(value)
 
-        value = self._key_as_value(self.key_as_value, f_tosca_path)
-        value = self._convert_units(self.unit_gb, "GB", value, is_float=self.unit_fractional)
-        value = self._only_number(self.only_number, value, is_float=self.only_number_float)
-        value = self._min_1(self.min_1, value)
-        value = self._append_to_list(self.append_list, f_sol6_path, value)
-        value = self._format_as_valid(self.format_as_ip, f_sol6_path, value,
-                                      self.variables["sol6"]["VALID_PROTOCOLS_VAL"],
-                                      none_found=self.format_invalid_none,
-                                      prefix=self.variables["sol6"]["PROTOCOLS_PREFIX_VAL"])
-        value = self._format_as_valid(self.format_as_disk, f_sol6_path, value,
-                                      self.variables["sol6"]["VALID_DISK_FORMATS_VAL"],
-                                      none_found=self.format_invalid_none)
-        value = self._format_as_valid(self.format_as_container, f_sol6_path, value,
-                                      self.variables["sol6"]["VALID_CONTAINER_FORMATS_VAL"],
-                                      none_found=self.format_invalid_none)
-        value = self._format_as_valid(self.format_as_aff_scope, f_sol6_path, value,
-                                      self.variables["sol6"]["VALID_AFF_SCOPES_VAL"],
-                                      none_found=self.format_invalid_none)
-        value = self._format_as_valid(self.format_as_storage, f_sol6_path, value,
-                                      self.variables["sol6"]["VALID_STORAGE_TYPES_VAL"],
-                                      none_found=self.format_invalid_none, fuzzy=True)
-        value = self._first_list_elem(self.first_list_elem, f_sol6_path, value)
-        value = self._check_for_null(value)
-
-        return value
+    def get_transforms(self, options):
+        """
+        The transforms for the options of a rule, only built once for each set of options
+        """
+        key = (type(self), options)
+        transforms = self.lookups.flag_transforms.get(key)
+        if transforms is None:
+            transforms = tuple(self.build_transforms(options))
+            self.lookups.flag_transforms[key] = transforms
+        return transforms
+
+    def build_transforms(self, options):
+        """
+        The transforms for the active options, in the order they are applied.
+        Each one is called with (converter, sol6 path, value) and returns the new value, so a rule
+        without flags doesn't run any. They are shared by the conversions of the same config, so they
+        can only use the converter they are called with. If more flags need to be added, override this method
+        """
+        transforms = []
+        if options.unit_gb:
+            transforms.append(lambda conv, path, value:
+                              conv._convert_units(True, "GB", value, is_float=options.unit_fractional))
+        if options.only_number:
+            transforms.append(lambda conv, path, value:
+                              conv._only_number(True, value, is_float=options.only_number_float))
+        if options.min_1:
+            transforms.append(lambda conv, path, value: conv._min_1(True, value))
+        if options.append_list:
+            transforms.append(lambda conv, path, value:
+                              conv._append_to_list(True, path, value, fail_silent=options.fail_silent))
+
+        valid_formats = [
+            (options.format_as_ip, "VALID_PROTOCOLS_VAL", self.variables["sol6"]["PROTOCOLS_PREFIX_VAL"], False),
+            (options.format_as_disk, "VALID_DISK_FORMATS_VAL", "", False),
+            (options.format_as_container, "VALID_CONTAINER_FORMATS_VAL", "", False),
+            (options.format_as_aff_scope, "VALID_AFF_SCOPES_VAL", "", False),
+            (options.format_as_storage, "VALID_STORAGE_TYPES_VAL", "", True)
+        ]
+        for option, name, prefix, fuzzy in valid_formats:
+            if option:
+                transforms.append(self._valid_transform(self.get_valid_values(name, fuzzy), prefix,
+                                                        options.format_invalid_none))
+
+        if options.first_list_elem:
+            transforms.append(lambda conv, path, value: conv._first_list_elem(True, path, value))
+        return transforms
+
+    def get_valid_values(self, name, fuzzy=False):
+        """
+        The ValidValues for a list of valid values in the sol6 config, only built once per config
+        """
+        valid = self.lookups.valid_values.get((name, fuzzy))
+        if valid is None:
+            valid = ValidValues(self.variables["sol6"][name], fuzzy=fuzzy)
+            self.lookups.valid_values[(name, fuzzy)] = valid
+        return valid
 
-    def set_flags_false(self):
-        """
-        Set all the given flags false.
-        If more flags need to be added, override this method
-        """
-        # Reset these for every mapping
-        self.key_as_value       = False
-        self.only_number        = False
-        self.only_number_float  = False
-        self.append_list        = False
-        self.first_list_elem    = False
-        self.tosca_use_value    = False
-        self.format_as_ip       = False
-        self.format_as_container = False
-        self.format_as_disk     = False
-        self.format_as_aff_scope = False
-        self.format_as_storage = False
-        self.fail_silent        = False
-        self.req_parent         = False
-        self.format_invalid_none = False
-        self.unit_gb            = False
-        self.unit_fractional    = False
-        self.min_1              = False
-
-    def set_flags_loop(self, flags, keys):
-        """
-        Handle figuring out which flags need to be set in O(n) time
-        """
-        # Ensure flags is iterable
-        if not isinstance(flags, tuple):
-            flags = [flags]
-        if flags and not flags[0] == '':
-            log.debug("Flags: {}".format(flags))
-
-        for flag in flags:
-            if flag == keys.FLAG_KEY_SET_VALUE:
-                self.key_as_value = True
-            if flag == keys.FLAG_ONLY_NUMBERS:
-                self.only_number = True
-            if flag == keys.FLAG_APPEND_LIST:
-                self.append_list = True
-            if flag == keys.FLAG_ONLY_NUMBERS_FLOAT:
-                self.only_number_float = True
-            if flag == keys.FLAG_LIST_FIRST:
-                self.first_list_elem = True
-            if flag == keys.FLAG_USE_VALUE:
-                self.tosca_use_value = True
-            if flag == keys.FLAG_FORMAT_IP:
-                self.format_as_ip = True
-            if flag == keys.FLAG_FAIL_SILENT:
-                self.fail_silent = True
-            if flag == keys.FLAG_REQ_PARENT:
-                self.req_parent = True
-            if flag == keys.FLAG_FORMAT_DISK_FMT:
-                self.format_as_disk = True
-            if flag == keys.FLAG_FORMAT_CONT_FMT:
-                self.format_as_container = True
-            if flag == keys.FLAG_FORMAT_AFF_SCOPE:
-                self.format_as_aff_scope = True
-            if flag == keys.FLAG_FORMAT_STORAGE_TYPE:
-                self.format_as_storage = True
-            if flag == keys.FLAG_FORMAT_INVALID_NONE:
-                self.format_invalid_none = True
-            if flag == keys.FLAG_UNIT_GB:
-                self.unit_gb = True
-            if flag == keys.FLAG_UNIT_FRACTIONAL:
-                self.unit_fractional = True
-            if flag == keys.FLAG_MIN_1:
-                self.min_1 = True
+    @staticmethod
+    def _valid_transform(valid_formats, prefix, none_found):
+        return lambda conv, path, value: conv._format_as_valid(True, path, value, valid_formats,
+                                                               none_found=none_found, prefix=prefix)
 
     # ---------------------
     # ** Specific flag methods **
-    def _append_to_list(self, option, path, value):
+    def _append_to_list(self, option, path, value, fail_silent=False):
         if not option:
             return value
-        cur_list = get_path_value(path, self.vnfd, must_exist=False, no_msg=self.fail_silent)
+        cur_list = get_path_value(path, self.vnfd, must_exist=False, no_msg=fail_silent)
         if cur_list:
             if not isinstance(cur_list, list):
                 raise TypeError("{} is not a list".format(cur_list))
             return list(cur_list).append(value)
 
-    def _key_as_value(self, option, path):
+    def _key_as_value(self, option, path, fail_silent=False):
         if option:
             return KeyUtils.get_path_last(path)
-        return get_path_value(path, self.tosca_vnf, must_exist=False, no_msg=self.fail_silent)
+        return get_path_value(path, self.tosca_vnf, must_exist=False, no_msg=fail_silent,
+                              merge_cache=self.merge_cache)
 
     @staticmethod
     def _only_number(option, value, is_float=False):
@@ -333,10 +357,11 @@ class Sol6Converter:
         return value[0]
 
     @staticmethod
-    def _format_as_valid(option, path, value, valid_formats, none_found=False, prefix="", fuzzy=False):
+    def _format_as_valid(option, path, value, valid_formats, none_found=False, prefix=""):
         """
-        Take the value, and a list of valid options, see if the value is any of the valid ones.
+        Take the value, and the valid options, see if the value is any of the valid ones.
         Return the output as a list (for some reason)
+        :param valid_formats: A ValidValues
         :optional none_found: Return None if a valid match is not found
         """
         if not option:
@@ -348,32 +373,24 @@ class Sol6Converter:
             # If it is, make sure it isn't a reference to the tosca_vnf
             value = list(value)
         for i, item in enumerate(value):
-            found, value[i] = Sol6Converter._fmt_val(item, valid_formats, none_found, fuzzy=fuzzy)
+            found, value[i] = Sol6Converter._fmt_val(item, valid_formats, none_found)
             if not found:
-                log.error("Value '{}' not found in valid formats: {}".format(item, valid_formats))
+                log.error("Value '{}' not found in valid formats: {}".format(item, valid_formats.options))
             if value[i]:
                 value[i] = prefix + value[i]
         # Any value not matching will be returned with a (INVALID) at the end
         return value
 
     @staticmethod
-    def _fmt_val(val, valid_opts, return_none, fuzzy=False):
-        """Format the value with the list, called from _format_as_valid"""
+    def _fmt_val(val, valid_opts, return_none):
+        """Format the value with the ValidValues, called from _format_as_valid"""
         if not isinstance(val, str):
             return False, "{} (INVALID)".format(val)
 
-        tmp_val = val.lower()
-
-        for opt in valid_opts:
-            tmp_opt = opt.lower()
-            tmp_val = tmp_val.replace("_", "-")
-            # We found a valid mapping, so set the value to the actual formatted value
-            if tmp_val == tmp_opt:
-                return True, str(opt)
-            # Do more lax checking if specified
-            if fuzzy:
-                if tmp_val in tmp_opt or tmp_opt in tmp_val:
-                    return True, str(opt)
+        # We found a valid mapping, so set the value to the actual formatted value
+        opt = valid_opts.match(val)
+        if opt is not None:
+            return True, str(opt)
 
         if return_none:
             return False, None
@@ -421,26 +438,30 @@ class Sol6Converter:
     # ---------------------
 
     @staticmethod
-    def find_provider(tosca_lines):
+    def find_provider(tosca_vnf):
         """
-        Do a dumb search over the file to find the provider
+        Find the value of the first 'provider' key in the parsed TOSCA, in the order of the file.
+        Keys that aren't set to a plain value, like type definitions, are skipped
         """
-        found = None
-        for l in tosca_lines:
-            if "provider:" in str(l):
-                found = l
-                break
-        if not found:
+        found = Sol6Converter._find_key_value(tosca_vnf, "provider")
+        if found is None:
             raise ValueError("Provider not found")
-        prov = found.decode("utf-8").strip()
-        val = prov.split(":")[-1].strip()
-        return val.lower()
-
-
-def is_hashable(obj):
-    """Determine whether 'obj' can be hashed."""
-    try:
-        hash(obj)
-    except TypeError:
-        return False
-    return True
+        return str(found).strip().lower()
+
+    @staticmethod
+    def _find_key_value(item, key):
+        """Depth first search for the first scalar value of key, dicts keep the order of the file"""
+        if isinstance(item, dict):
+            for k, v in item.items():
+                if k == key and v is not None and not isinstance(v, (dict, list)):
+                    return v
+                found = Sol6Converter._find_key_value(v, key)
+                if found is not None:
+                    return found
+        elif isinstance(item, list):
+            for v in item:
+                found = Sol6Converter._find_key_value(v, key)
+                if found is not None:
+                    return found
+        return None
+
@@ -4,9 +4,14 @@ The TOSCA variables are mapped to the SOL6 ones, they must have the same names.
 The program does not attempt to map variables beginning with '_'
 """
 from mapping_v2 import *
+from mapping_plan import MappingPlan
+from collections import namedtuple
 import logging
 log = logging.getLogger(__name__)
 
+# The connection point mappings split up by V2MapBase.partition_cps
+CpGroups = namedtuple("CpGroups", ["external", "internal", "mgmt", "orch"])
+
 
 class PathMaping:
     @staticmethod
@@ -16,27 +21,24 @@ class PathMaping:
         If _VAL is at the end of the variable, don't process the path, just set the variable to
         the value.
         """
-        var_tosca = variables["tosca"]
-        var_sol6 = variables["sol6"]
-        processed_tosca = {}
-        processed_sol6 = {}
-
-        for k in var_tosca:
-            if "_VAL" not in k:
-                val = PathMaping.get_full_path(k, var_tosca)
-            else:
-                val = var_tosca[k]
-            processed_tosca[k] = val
+        variables["tosca"] = PathMaping.resolve_table(variables["tosca"])
+        variables["sol6"] = PathMaping.resolve_table(variables["sol6"])
+        return variables
 
-        for k in var_sol6:
+    @staticmethod
+    def resolve_table(table):
+        """
+        Return a copy of a 'tosca' or 'sol6' table with all the paths resolved, see PathResolver
+        """
+        resolver = PathResolver(table)
+        processed = {}
+        for k in table:
             if "_VAL" not in k:
-                val = PathMaping.get_full_path(k, var_sol6)
+                processed[k] = resolver.resolve(k)
             else:
-                val = var_sol6[k]
-            processed_sol6[k] = val
-        variables["tosca"] = processed_tosca
-        variables["sol6"] = processed_sol6
-        return variables
+                processed[k] = table[k]
+        resolver.report()
+        return processed
 
     @staticmethod
     def set_variables(cur_dict, obj, exclude=""):
@@ -63,14 +65,89 @@ class PathMaping:
 
     @staticmethod
     def get_full_path(elem, dic):
-        try:
-            if not isinstance(dic[elem], list):
-                return dic[elem]
-        except KeyError:
+        if elem not in dic:
             log.error("Could not find {} as a parent".format(elem))
             return ""
+        resolver = PathResolver(dic)
+        path = resolver.resolve(elem)
+        resolver.report()
+        return path
+
+
+class PathResolver:
+    """
+    Resolves the paths in a config table, where a value of [parent, key] is the path of parent
+    followed by key, and any other value is used as-is.
+
+    Each key is only resolved once, its parents are resolved first and then it is built from them.
+    The resolved paths are kept in resolved, so they can be reused.
+    Missing parents and cycles are collected while resolving, and report() gives them all at once.
+    """
+    def __init__(self, table):
+        self.table = table
+        self.resolved = {}
+        # {missing parent: [keys that reference it]}
+        self.missing = {}
+        # Lists of the keys in each cycle
+        self.cycles = []
+
+    def resolve(self, key):
+        """
+        Get the full path of key, resolving any of its parents that haven't been resolved yet
+        """
+        if key in self.resolved:
+            return self.resolved[key]
+
+        # Walk up the parents with a stack instead of recursing, so long chains and cycles
+        # can't hit the recursion limit
+        stack = [key]
+        on_stack = {key}
+        while stack:
+            cur = stack[-1]
+            value = self.table[cur]
+            if not isinstance(value, list):
+                self._set(stack, on_stack, value)
+                continue
+
+            parent = value[0]
+            if parent in self.resolved:
+                parent_path = self.resolved[parent]
+            elif parent not in self.table:
+                self.missing.setdefault(parent, []).append(cur)
+                parent_path = ""
+            elif parent in on_stack:
+                self.cycles.append(stack[stack.index(parent):])
+                parent_path = ""
+            else:
+                stack.append(parent)
+                on_stack.add(parent)
+                continue
+
+            self._set(stack, on_stack, "{}{}{}".format(parent_path, SPLIT_CHAR, value[1]))
+        return self.resolved[key]
+
+    def _set(self, stack, on_stack, path):
+        cur = stack.pop()
+        on_stack.discard(cur)
+        self.resolved[cur] = path
+
+    def report(self):
+        """
+        Log the missing parents, if there are any cycles raise a ValueError with all the problems
+        """
+        if not self.missing and not self.cycles:
+            return
 
-        return "{}{}{}".format(PathMaping.get_full_path(dic[elem][0], dic), SPLIT_CHAR, dic[elem][1])
+        problems = []
+        for parent, keys in self.missing.items():
+            problems.append("Could not find {} as a parent (of {})".format(parent, ", ".join(keys)))
+        for cycle in self.cycles:
+            problems.append("Cycle in parents: {}".format(" -> ".join(cycle + [cycle[0]])))
+        msg = "Problems resolving the config paths:\n\t{}".format("\n\t".join(problems))
+
+        if self.cycles:
+            raise ValueError(msg)
+        log.error(msg)
 
 
 class TOSCA_BASE(PathMaping):
@@ -124,18 +201,43 @@ class V2MapBase(V2Mapping):
     FLAG_UNIT_GB                    = "UNITISGB"
     FLAG_UNIT_FRACTIONAL            = "UNITISFRACTIONAL"
 
+    # The converter option each flag turns on, subclasses with their own flags add them to this
+    FLAG_ATTRIBUTES = {
+        FLAG_KEY_SET_VALUE:         "key_as_value",
+        FLAG_ONLY_NUMBERS:          "only_number",
+        FLAG_ONLY_NUMBERS_FLOAT:    "only_number_float",
+        FLAG_MIN_1:                 "min_1",
+        FLAG_USE_VALUE:             "tosca_use_value",
+        FLAG_APPEND_LIST:           "append_list",
+        FLAG_LIST_FIRST:            "first_list_elem",
+        FLAG_FORMAT_IP:             "format_as_ip",
+        FLAG_FORMAT_DISK_FMT:       "format_as_disk",
+        FLAG_FORMAT_CONT_FMT:       "format_as_container",
+        FLAG_FORMAT_AFF_SCOPE:      "format_as_aff_scope",
+        FLAG_FORMAT_STORAGE_TYPE:   "format_as_storage",
+        FLAG_FORMAT_INVALID_NONE:   "format_invalid_none",
+        FLAG_FAIL_SILENT:           "fail_silent",
+        FLAG_REQ_PARENT:            "req_parent",
+        FLAG_UNIT_GB:               "unit_gb",
+        FLAG_UNIT_FRACTIONAL:       "unit_fractional"
+    }
+
     def __init__(self, dict_tosca, dict_sol6, c_log=None, variables=None):
         super().__init__(dict_tosca, dict_sol6)
         self.va_s = None
         self.va_t = None
-        self.mapping = []
+        self.mapping = MappingPlan(self.FLAG_ATTRIBUTES)
 
         if variables:
             self.va_t = variables["tosca"]
             self.va_s = variables["sol6"]
 
     def add_map(self, cur_map):
-        self.mapping.append(cur_map)
+        """
+        Add a ((tosca_path, flags), sol6_path) or ((tosca_path, flags), [sol6_path, [MapElem, ...]])
+        mapping to the plan
+        """
+        return self.mapping.add(cur_map)
 
     def set_value(self, val, path, index, prefix_value=None, prefix_index=None):
         _mapping = MapElem(val, index)
@@ -143,6 +245,28 @@ class V2MapBase(V2Mapping):
             _mapping = MapElem(prefix_value, prefix_index, parent_map=_mapping)
         return (val, self.FLAG_KEY_SET_VALUE), [path, [_mapping]]
 
+    @staticmethod
+    def partition_cps(cps_map, ext_names, mgmt_names=()):
+        """
+        Split the connection point mappings up by name, in a single pass over cps_map
+        The external ones are named in ext_names, the internal ones are the rest. The external
+        ones are split again into mgmt, the ones that are in mgmt_names, and orch, the others.
+        :return: A CpGroups of MapLists, each in the same order as cps_map
+        """
+        ext_names = set(ext_names)
+        mgmt_names = set(mgmt_names)
+        groups = CpGroups(MapList(), MapList(), MapList(), MapList())
+        for c_map in cps_map:
+            if c_map.name in ext_names:
+                groups.external.append(c_map)
+                if c_map.name in mgmt_names:
+                    groups.mgmt.append(c_map)
+                else:
+                    groups.orch.append(c_map)
+            else:
+                groups.internal.append(c_map)
+        return groups
+
     def get_tosca_value(self, value):
         return self.get_value(value, self.va_t, "tosca")
 
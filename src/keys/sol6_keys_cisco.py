@@ -4,7 +4,7 @@ The TOSCA variables are mapped to the SOL6 ones, they must have the same names.
 The program does not attempt to map variables beginning with '_'
 """
 from keys.sol6_keys import TOSCA_BASE, SOL6_BASE, V2MapBase
-from mapping_v2 import MapElem
+from mapping_v2 import MapElem, MapList
 from utils.dict_utils import *
 from utils.list_utils import *
 from utils.key_utils import *
@@ -77,8 +77,16 @@ class V2Map(V2MapBase):
     # Marks this as requiring a value, and if there isn't one, make it 'root'
     FLAG_TYPE_ROOT_DEF              = "MUSTBESOMETHINGORROOT"
 
+    FLAG_ATTRIBUTES = merge_two_dicts(V2MapBase.FLAG_ATTRIBUTES, {
+        FLAG_REQ_DELTA:             "req_delta_valid",
+        FLAG_VAR:                   "is_variable",
+        FLAG_TYPE_ROOT_DEF:         "default_root"
+    })
+
     def __init__(self, dict_tosca, dict_sol6, variables=None):
         super().__init__(dict_tosca, dict_sol6, c_log=log, variables=variables)
+        # dict_tosca can be a CowTree, read from its root
+        dict_tosca = self.dict_tosca
 
         # Make the lines shorter
         add_map = self.add_map
@@ -135,7 +143,7 @@ class V2Map(V2MapBase):
                 # Now we need to copy the data into a new location with the proper paths in the tosca dict
                 # with the name we generated
                 t_path = MapElem.format_path(MapElem(name, 0), tv("sw_image_data"), use_value=False)
-                set_path_to(t_path, dict_tosca, img_data, create_missing=True)
+                self.set_tosca_path(t_path, img_data)
 
                 # Then, add a new mapping into sw_map with that name
                 sw_map.append(MapElem(name, 100))
@@ -241,12 +249,13 @@ class V2Map(V2MapBase):
         # From the mapping      [c1 -> 0, parent=(0 -> 0, parent=(None))]
         # and the value_dict    {'VIM_FLAVOR_CF': 'c1'}
         # generate the mapping  [VIM_FLAVOR_CF -> 0, parent=(None)]
+        # The names in flavor_map are the VDUs, which are unique, so there is at most one match
         vim_flavors_map = []
         for k, v in vim_flavors_rev.items():
-            for m in flavor_map:
-                if m.name == v:
-                    # Add parent here so the virtual compute can access the VDU to put data in
-                    vim_flavors_map.append(MapElem(k, m.cur_map, m.parent_map))
+            m = flavor_map.get_name(v)
+            if m is not None:
+                # Add parent here so the virtual compute can access the VDU to put data in
+                vim_flavors_map.append(MapElem(k, m.cur_map, m.parent_map))
 
         # *** End VDU Flavors ***
 
@@ -266,8 +275,8 @@ class V2Map(V2MapBase):
                 # so we need to create a new value that we can map later
                 # We *don't* need to modify day0_map because we ensure_map_values, which means they're
                 # unique references
-                set_path_to(MapElem.format_path(c0, tv("vdu_day0_custom_id"), use_value=False),
-                            dict_tosca, custom_id, create_missing=True)
+                self.set_tosca_path(MapElem.format_path(c0, tv("vdu_day0_custom_id"), use_value=False),
+                                    custom_id)
             day0_map.append(cur_day0)
 
         day0_map = flatten(day0_map)
@@ -311,10 +320,18 @@ class V2Map(V2MapBase):
         if ext_nics:
             # Extract the names from the list
             ext_nics = [e[get_dict_key(e)][0] for e in ext_nics]
-            # Intersection: ext_nics and cps_map
-            ext_cps = [m for m in cps_map if any(nic == m.name for nic in ext_nics)]
-            # Union: ext_nics and cps_map
-            int_cps = [m for m in cps_map if not any(nic == m.name for nic in ext_nics)]
+            # Get the NICs that are assigned to management
+            # This does not take into account if they are supposed to be mapped to an ECP
+            mgmt_cps = self.generate_map(None, tv("int_cpd_mgmt_identifier"),
+                                         field_filter=TOSCA.int_cp_mgmt,
+                                         map_function=self.int_cp_mapping,
+                                         map_args={"vdu_map": vdu_map})
+
+            # ext_cps are the CPs in ext_nics, int_cps the rest of them
+            # mgmt_cps_map are the ext_cps that are management and should have an external connection point
+            # created, orch_cps_map are the non-management ext_cps
+            ext_cps, int_cps, mgmt_cps_map, orch_cps_map = \
+                self.partition_cps(cps_map, ext_nics, [m.name for m in mgmt_cps])
 
             # For the non-external connection points, we need to create a virtual link for them
             # They already have names in the YAML, under virtual-link, so link the CPs to those virtual
@@ -339,23 +356,6 @@ class V2Map(V2MapBase):
             # Remove any gaps in the mapping
             MapElem.ensure_map_values(icp_create_layer_prot, start_val=0)
 
-            # Get the NICs that are assigned to management
-            # This does not take into account if they are supposed to be mapped to an ECP
-            mgmt_cps_map = self.generate_map(None, tv("int_cpd_mgmt_identifier"),
-                                             field_filter=TOSCA.int_cp_mgmt,
-                                             map_function=self.int_cp_mapping,
-                                             map_args={"vdu_map": vdu_map})
-
-            # Intersection: ext_cps and mgmt_cps_map
-            # This is the NICs that are management and should have an
-            # external connection point created
-            mgmt_cps_map = [m for m in ext_cps if any(x.name == m.name for x in mgmt_cps_map)]
-            # Union: ext_cps and mgmt_cps_map
-            # Get the non-management NICs that have external connection points
-            orch_cps_map = [m for m in ext_cps if not any(x.name == m.name for x in mgmt_cps_map)]
-            # Note: this can be sped up by putting both of these
-            # in a single loop
-
         # Security group map
         # The result isn't an array, so set the top-level values to None
         security_group_map_temp = self.generate_map(None, tv("security_group_identifier"),
@@ -445,12 +445,13 @@ class V2Map(V2MapBase):
                 # Figure out if we have a delta defined
                 if not aspect_deltas:
                     # If we don't then set the value to 'unknown'
-                    set_path_to(cur_path, dict_tosca, sv("df_scale_aspect_no_delta_VAL"), create_missing=True)
+                    self.set_tosca_path(cur_path, sv("df_scale_aspect_no_delta_VAL"))
 
                 scaling_deltas_map.append(self.generate_map(cur_path, None, parent=cur_vdu_aspect,
                                                             map_args={"none_key": True}))
 
-        scaling_aspects_map = flatten(scaling_aspects_map)
+        # The deltas look up their aspect by name
+        scaling_aspects_map = MapList(flatten(scaling_aspects_map))
         scaling_deltas_map = flatten(scaling_deltas_map)
 
         # **** Scaling Aspect Deltas ****
@@ -471,7 +472,7 @@ class V2Map(V2MapBase):
         # Find the list of deltas that are part of this aspect name, and assign them to the dict index
 
         for aspect in deltas_dict_map.keys():
-            c = get_roots_from_filter(dict_tosca, "aspect", aspect)
+            c = self.tosca_index.get_roots("aspect", aspect)
             for root in c:
                 root = root[get_dict_key(root)]
                 deltas_dict_map[aspect].append(root[KeyUtils.get_path_last(tv("deltas_list"))])
@@ -823,30 +824,26 @@ class V2Map(V2MapBase):
         if "filtered" not in kwargs or "vdu_map" not in kwargs:
             raise KeyError("The proper arguments haven't been passed for this method")
 
-        mapping = []
-        filtered = kwargs["filtered"]
-        vdu_mappings = list(kwargs["vdu_map"])
+        mapping = MapList()
+        # Index the entries by name, the last entry with a name is the one that gets used
+        filtered = {get_dict_key(x): x for x in kwargs["filtered"]}
+        vdu_mappings = MapList.of(kwargs["vdu_map"])
         cur_num = map_start
         last_vdu = None
 
+        # Get the virtual_binding path for the elements from the filtered list
+        # Remove the beginning of the path since we aren't dealing with the entire dict here
+        path_lvl = KeyUtils.remove_path_level(self.get_tosca_value("int_cpd_virt_binding"),
+                                              self.get_tosca_value("node_templates"))
+
         # Loop through the CP names
         for name in names:
             # Get the dict that's related to this name
-            # There should only be one element in the list
-            entry = [x for x in filtered if get_dict_key(x) == name].pop()
-
-            # Get the virtual_binding for this element from the filtered list
-            # Remove the beginning of the path since we aren't dealing with the entire dict here
-            path_lvl = KeyUtils.remove_path_level(self.get_tosca_value("int_cpd_virt_binding"),
-                                                  self.get_tosca_value("node_templates"))
+            entry = filtered[name]
             vdu = get_path_value(path_lvl.format(name), entry)
 
             # We need to find the parent mapping so we can include it in the map definition
-            cur_vdu_map = None
-            for v_map in vdu_mappings:
-                if v_map.name == vdu:
-                    cur_vdu_map = v_map
-                    break
+            cur_vdu_map = vdu_mappings.get_name(vdu)
 
             # Iterate the map number if we've seen this vdu before, otherwise start over from 0
             if last_vdu == vdu:
@@ -859,4 +856,3 @@ class V2Map(V2MapBase):
             mapping.append(MapElem(name, cur_num, cur_vdu_map))
 
         return mapping
-
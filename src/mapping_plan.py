@@ -0,0 +1,156 @@
+"""
+The mapping rules built by a V2Map, kept as a plan that can be looked at, serialized and compared
+separately from running it
+"""
+import json
+import difflib
+from collections import namedtuple
+from utils.dict_utils import compile_path
+
+
+class MappingRule:
+    """
+    A single {TOSCAPath : SOL6Path} mapping.
+    If mapping is set, it is the list of MapElems the paths are formatted with for each value,
+    otherwise the paths are used as they are.
+    options are the flags decoded by the MappingPlan, the converter reads them instead of the flags.
+    """
+    __slots__ = ("index", "tosca_path", "flags", "sol6_path", "mapping", "options")
+
+    def __init__(self, index, tosca_path, flags, sol6_path, mapping=None, options=None):
+        self.index = index
+        self.tosca_path = tosca_path
+        self.flags = flags
+        self.sol6_path = sol6_path
+        self.mapping = mapping
+        self.options = options
+
+    @staticmethod
+    def from_map(index, cur_map):
+        """
+        Build a rule from the add_map format, ((tosca_path, flags), sol6_path) or
+        ((tosca_path, flags), [sol6_path, [MapElem, ...]])
+        """
+        (tosca_path, flags), map_sol6 = cur_map
+        mapping = None
+        if isinstance(map_sol6, list):
+            map_sol6, mapping = map_sol6
+        return MappingRule(index, MappingRule.compile(tosca_path), MappingRule.normalize_flags(flags),
+                           MappingRule.compile(map_sol6), mapping)
+
+    @staticmethod
+    def compile(path):
+        """Paths are compiled, anything else (values to set, None) is kept as it is"""
+        if isinstance(path, str):
+            return compile_path(path)
+        return path
+
+    @staticmethod
+    def normalize_flags(flags):
+        """A single flag or a tuple of them, as a tuple without blanks or duplicates"""
+        if not isinstance(flags, tuple):
+            flags = (flags,)
+        return tuple(dict.fromkeys(f for f in flags if f))
+
+    @property
+    def has_mapping(self):
+        return self.mapping is not None
+
+    def as_dict(self):
+        return {
+            "index": self.index,
+            "tosca": _path_str(self.tosca_path),
+            "flags": list(self.flags),
+            "sol6": _path_str(self.sol6_path),
+            "mapping": [_elem_chain(elem) for elem in self.mapping] if self.has_mapping else None
+        }
+
+    def describe(self):
+        mapped = " x{}".format(len(self.mapping)) if self.has_mapping else ""
+        flags = " [{}]".format(", ".join(self.flags)) if self.flags else ""
+        return "{:>4}: {} -> {}{}{}".format(self.index, _path_str(self.tosca_path),
+                                           _path_str(self.sol6_path), mapped, flags)
+
+    def __repr__(self):
+        return "MappingRule({})".format(self.describe().strip())
+
+
+class MappingPlan:
+    """
+    The ordered list of MappingRules a converter runs
+
+    The flags of each rule are decoded once when it's added, into an immutable namedtuple with a
+    bool for every option in flag_attributes, so they don't have to be checked while running.
+    """
+    def __init__(self, flag_attributes=None):
+        """
+        :param flag_attributes: {flag: option name}, flags that aren't in here are ignored
+        """
+        self.rules = []
+        self.flag_attributes = flag_attributes or {}
+        self.options_type = namedtuple("MappingOptions", list(dict.fromkeys(self.flag_attributes.values())))
+        # Rules with the same flags share their options
+        self._options = {}
+
+    def add(self, cur_map):
+        rule = MappingRule.from_map(len(self.rules), cur_map)
+        rule.options = self.decode_flags(rule.flags)
+        self.rules.append(rule)
+        return rule
+
+    def decode_flags(self, flags):
+        """
+        Get the options for a tuple of flags, see MappingRule.normalize_flags
+        """
+        options = self._options.get(flags)
+        if options is None:
+            active = set(self.flag_attributes[f] for f in flags if f in self.flag_attributes)
+            options = self.options_type(*(name in active for name in self.options_type._fields))
+            self._options[flags] = options
+        return options
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __getitem__(self, index):
+        return self.rules[index]
+
+    def describe(self):
+        """One line per rule, for reading"""
+        return "\n".join(rule.describe() for rule in self.rules)
+
+    def as_list(self):
+        return [rule.as_dict() for rule in self.rules]
+
+    def dumps(self):
+        """The plan as JSON, values that JSON doesn't handle are written as strings"""
+        return json.dumps(self.as_list(), indent=2, default=str)
+
+    @staticmethod
+    def diff(plan_a, plan_b, name_a="a", name_b="b"):
+        """
+        The unified diff between two plans, either MappingPlans or the JSON from dumps
+        :return: A list of the diff lines, empty if the plans are the same
+        """
+        lines = []
+        for plan in (plan_a, plan_b):
+            if isinstance(plan, MappingPlan):
+                plan = plan.dumps()
+            lines.append(plan.splitlines())
+        return list(difflib.unified_diff(lines[0], lines[1], fromfile=name_a, tofile=name_b, lineterm=""))
+
+
+def _path_str(path):
+    return None if path is None else str(path)
+
+
+def _elem_chain(elem):
+    """[[name, cur_map], [parent name, parent cur_map], ...] for a MapElem"""
+    chain = []
+    while elem:
+        chain.append([elem.name, elem.cur_map])
+        elem = elem.parent_map
+    return chain
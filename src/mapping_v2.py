@@ -15,8 +15,15 @@ class V2Mapping:
     KEY_SOL6 = "dict_sol6"
 
     def __init__(self, dict_tosca, dict_sol6):
-        self.dict_tosca = dict_tosca
+        """
+        :param dict_tosca: The tosca dict, or a CowTree of it. It is only written to through the
+        CowTree, so the parsed document is never changed
+        """
+        self.tosca_tree = dict_tosca if isinstance(dict_tosca, CowTree) else CowTree(dict_tosca)
+        self.dict_tosca = self.tosca_tree.root
         self.dict_sol6 = dict_sol6
+        # Most of the mappings search the whole tosca dict by identifier, so only walk it once
+        self.tosca_index = RootIndex(self.dict_tosca)
 
     @staticmethod
     def parent_match(map1_list, start_num=0, **kwargs):
@@ -37,19 +44,15 @@ class V2Mapping:
         if "value_dict" not in kwargs:
             raise KeyError("value_dict not included in kwargs")
         value_dict = kwargs["value_dict"]
-        parent_map = kwargs["parent_map"]
+        parent_map = MapList.of(kwargs["parent_map"])
 
-        result = []
+        result = MapList()
         for key in map1_list:
             value = value_dict[key]
-            final_parent_map = None
 
             # Find the element in the parent map that the cur element is mapped to
             # For example [c1_nic0 -> c1] and [c1 -> 0]
-            for p_map in parent_map:
-                if p_map.name == value:
-                    final_parent_map = p_map
-                    break
+            final_parent_map = parent_map.get_name(value)
 
             map_elem = MapElem(key, value, final_parent_map)
             result.append(map_elem)
@@ -71,35 +74,30 @@ class V2Mapping:
         :return: A dict of the mappings
         """
         parent_map = None
-        if "parent_map" in kwargs:
-            parent_map = kwargs["parent_map"]
+        if "parent_map" in kwargs and kwargs["parent_map"]:
+            parent_map = MapList.of(kwargs["parent_map"])
         value_map = None
-        if "value_map" in kwargs:
-            value_map = kwargs["value_map"]
+        if "value_map" in kwargs and kwargs["value_map"]:
+            value_map = MapList.of(kwargs["value_map"])
         none_value = kwargs["none_value"] if "none_value" in kwargs else False
         none_key = kwargs["none_key"] if "none_key" in kwargs else False
 
-        result = []
+        result = MapList()
         cur_num = start_num
         for item_1 in map1_list:
             try:
-                if item_1 in result:
-                    log.info("Dict slot {} is already full with {}".format(item_1, result[item_1]))
+                existing = result.get_name(item_1)
+                if existing is not None:
+                    log.info("Dict slot {} is already full with {}".format(item_1, existing))
 
                 # We need to find the parent mapping so we can include it in the map definition
                 final_parent_map = None
                 if parent_map:
                     # Find the element in the parent map that the cur element is mapped to
                     # For example [c1_nic0 -> c1] and [c1 -> 0]
-                    for p_map in parent_map:
-                        if p_map.name == item_1:
-                            final_parent_map = p_map
-                            break
+                    final_parent_map = parent_map.get_name(item_1)
                 elif value_map:
-                    for v_map in value_map:
-                        if v_map.name == cur_num:
-                            final_parent_map = v_map
-                            break
+                    final_parent_map = value_map.get_name(cur_num)
                 cur_num_val = None if none_value else cur_num
                 cur_item_1 = None if none_key else item_1
                 map_elem = MapElem(cur_item_1, cur_num_val, final_parent_map)
@@ -144,7 +142,7 @@ class V2Mapping:
                 p_val = get_path_value(path, self.dict_tosca, ensure_dict=True)
             except KeyError:
                 # The given path doesn't exist
-                return []
+                return MapList()
         else:
             # If there is no path, search the entire dict
             p_val = self.dict_tosca
@@ -152,7 +150,10 @@ class V2Mapping:
         # Get the relevant nodes based on field and field_value
         filtered = None
         if field and field_value:
-            filtered = get_roots_from_filter(p_val, field, field_value, user_filter=field_filter)
+            if path:
+                filtered = get_roots_from_filter(p_val, field, field_value, user_filter=field_filter)
+            else:
+                filtered = self.tosca_index.get_roots(field, field_value, user_filter=field_filter)
         elif path:
             # If we forgot to pass in a dict, use tosca
             if not cur_dict:
@@ -173,6 +174,14 @@ class V2Mapping:
 
         return result
 
+    def set_tosca_path(self, path, value):
+        """
+        Write a value into the tosca dict, this has to be used instead of set_path_to so the
+        parsed document isn't changed and the index is kept up to date
+        """
+        self.tosca_tree.set_path(path, value, create_missing=True)
+        self.tosca_index.clear()
+
     def generate_map_from_list(self, to_map, map_type="int", map_start=0,
                                map_function=None, map_args=None):
         if not isinstance(to_map, list):
@@ -208,6 +217,8 @@ class V2Mapping:
                 mapped = V2Mapping.map_ints(names, map_start, **kwargs)
             elif map_type == "parent_match":
                 mapped = V2Mapping.parent_match(names, map_start, **kwargs)
+        if mapped is not None:
+            mapped = MapList.of(mapped)
         return mapped
 
     @staticmethod
@@ -339,6 +350,8 @@ class MapElem:
 
     @staticmethod
     def get_mapping_name(mapping_list, req_name):
+        if isinstance(mapping_list, MapList):
+            return mapping_list.get_name(req_name)
         if isinstance(mapping_list, list):
             for c_map in mapping_list:
                 if not isinstance(c_map, MapElem):
@@ -373,26 +386,28 @@ class MapElem:
         Defaults to using the values of the mapping, but can be switched to use keys
         If the value of a mapping is None, it will not be formatted into the string.
         This allows different numbers of formattable elements.
+        The path can be a string or a CompiledPath, a string is returned.
         """
 
-        path_list = path.split(SPLIT_CHAR)
-        while "{}" in path_list:
-            # Get the index of the last occurrence of a formattable entry
-            index = max(idx for idx, val in enumerate(path_list)
-                        if val == '{}')
-            if elem:
+        path = compile_path(path)
+        if not path.placeholders:
+            return path.path
+
+        # Fill the placeholders from the last to the first, moving up the parent chain as we go
+        path_list = list(path.segments)
+        for index in reversed(path.placeholders):
+            while elem:
                 val = elem.cur_map if use_value else elem.name
+                elem = elem.parent_map
+                # Skip the given value if it's None, the parent is used for this placeholder instead
+                if val is not None:
+                    path_list[index] = "{}".format(val)
+                    break
             else:
-                val = ""
-                # Skip the given value if it's None
-            if val is not None:
-                path_list[index] = path_list[index].format(val)
-
-            if not elem:
+                # Out of mappings, blank this placeholder and leave the rest as they are
+                path_list[index] = ""
                 break
 
-            elem = elem.parent_map
-
         return SPLIT_CHAR.join(path_list)
 
     def __str__(self):
@@ -401,3 +416,101 @@ class MapElem:
     def __repr__(self):
         return self.__str__()
 
+
+
+class MapList(list):
+    """
+    A list of MapElems that also keeps a dict of their names, so get_name doesn't have to search
+    the list. Like searching the list, the first MapElem with a name is the one that is returned.
+
+    The names are indexed the first time get_name is used, appending keeps the index up to date,
+    any other change to the list rebuilds it on the next lookup.
+    Renaming a MapElem that is already in the list is not picked up.
+    """
+    def __init__(self, iterable=()):
+        super().__init__(iterable)
+        self._names = None
+
+    @staticmethod
+    def of(mapping):
+        """Return mapping if it is already a MapList, otherwise a MapList of it"""
+        if isinstance(mapping, MapList):
+            return mapping
+        return MapList(mapping)
+
+    def get_name(self, name):
+        """Return the first MapElem with the given name, None if there isn't one"""
+        if self._names is None:
+            self._names = {}
+            self._index(self)
+        try:
+            return self._names.get(name)
+        except TypeError:
+            # Unhashable names can't be in the index, so look for them the slow way
+            for c_map in self:
+                if isinstance(c_map, MapElem) and c_map.name == name:
+                    return c_map
+            return None
+
+    def _index(self, items):
+        for c_map in items:
+            if not isinstance(c_map, MapElem):
+                continue
+            try:
+                self._names.setdefault(c_map.name, c_map)
+            except TypeError:
+                pass
+
+    def _reset(self):
+        self._names = None
+
+    def append(self, item):
+        super().append(item)
+        if self._names is not None:
+            self._index((item,))
+
+    def extend(self, items):
+        items = list(items)
+        super().extend(items)
+        if self._names is not None:
+            self._index(items)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def __add__(self, other):
+        return MapList(list.__add__(self, other))
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self._reset()
+
+    def remove(self, item):
+        super().remove(item)
+        self._reset()
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        self._reset()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._reset()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._reset()
+
+    def reverse(self):
+        super().reverse()
+        self._reset()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._reset()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._reset()
@@ -0,0 +1,252 @@
+"""
+Writing the converted VNFD out.
+The JSON is encoded with the fastest backend that is installed, straight into the output instead of
+building the whole string first, and files are written to a temporary file that replaces the output
+when it's complete. The same content can also be written as XML that can be loaded into NSO.
+"""
+import io
+import os
+import json
+import math
+import logging
+from xml.sax.saxutils import escape, quoteattr
+log = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Size of the write buffer for output files, the encoder produces a lot of small pieces
+WRITE_BUFFER_SIZE = 1 << 16
+
+# The namespace of the top level element that NSO loads, it takes the place of 'data' in the JSON
+NSO_CONFIG_NAMESPACE = "http://tail-f.com/ns/config/1.0"
+# {YANG module: namespace} for the module prefixes in the output, the ones the default SOL6 config uses.
+# More can be added in the [xml_namespaces] table of the configs
+XML_NAMESPACES = {
+    "etsi-nfv-descriptors": "urn:etsi:nfv:yang:etsi-nfv-descriptors",
+    "cisco-etsi-nfvo": "http://cisco.com/ns/nso/cfp/cisco-etsi-nfvo",
+    "cisco-etsi-nfvo-sol1-vnfd-extensions": "http://cisco.com/ns/nso/cfp/cisco-etsi-nfvo-sol1-vnfd-extensions"
+}
+
+
+class JsonBackend:
+    """
+    The standard library json, the output is the same as json.dumps(content, indent=2), or without
+    any whitespace if compact
+    """
+    name = "json"
+
+    def write(self, content, f, compact=False):
+        """
+        Encode content as JSON into the binary file object f
+        :return: The name of the backend that wrote it
+        """
+        if compact:
+            encoder = json.JSONEncoder(separators=(",", ":"))
+        else:
+            encoder = json.JSONEncoder(indent=2)
+        text = io.TextIOWrapper(f, encoding="utf-8", write_through=False)
+        write = text.write
+        for chunk in encoder.iterencode(content):
+            write(chunk)
+        text.flush()
+        # Don't close f along with the wrapper
+        text.detach()
+        # Not self.name, the other backends fall back to this one
+        return JsonBackend.name
+
+
+class OrjsonBackend(JsonBackend):
+    """
+    orjson keeps the key order and formatting of json, but not everything is written the same way, so
+    those documents are left to json to keep the output the same:
+    non ASCII characters aren't escaped, NaN and Infinity are written as null, and floats that json
+    writes with an exponent (below 1e-4 or from 1e16) have a different exponent
+    """
+    name = "orjson"
+
+    def write(self, content, f, compact=False):
+        if _has_exponent_floats(content):
+            return super().write(content, f, compact)
+        option = orjson.OPT_NON_STR_KEYS
+        if not compact:
+            option |= orjson.OPT_INDENT_2
+        try:
+            data = orjson.dumps(content, option=option)
+        except TypeError as e:
+            # i.e. integers that don't fit in 64 bits
+            log.debug("orjson could not encode the output, using json: {}".format(e))
+            return super().write(content, f, compact)
+        if not data.isascii():
+            return super().write(content, f, compact)
+        f.write(data)
+        return self.name
+
+
+def _has_exponent_floats(content):
+    """
+    If there is a float in content that json writes as NaN/Infinity or with an exponent.
+    The output rarely has any floats at all, so this is only a walk over the containers
+    """
+    stack = [content]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+            # Keys are written as strings, but float ones have the same exponent as the values
+            stack.extend(key for key in value if isinstance(key, float))
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, float):
+            if not math.isfinite(value) or (value and not 1e-4 <= abs(value) < 1e16):
+                return True
+    return False
+
+
+JSON_BACKENDS = {"json": JsonBackend}
+if orjson is not None:
+    JSON_BACKENDS["orjson"] = OrjsonBackend
+
+
+def get_json_backend(name="auto"):
+    """
+    :param name: One of JSON_BACKENDS, or 'auto' for the fastest one that is installed
+    """
+    if name == "auto":
+        name = "orjson" if "orjson" in JSON_BACKENDS else "json"
+    if name not in JSON_BACKENDS:
+        raise ValueError("JSON backend '{}' is not available, installed backends: {}"
+                         .format(name, list(JSON_BACKENDS.keys())))
+    return JSON_BACKENDS[name]()
+
+
+def write_json(content, f, compact=False, backend=None):
+    """
+    Encode content as JSON into the binary file object f
+    :return: The name of the backend that wrote it
+    """
+    return (backend or get_json_backend()).write(content, f, compact)
+
+
+def write_json_file(content, output_file, compact=False, backend=None):
+    """
+    Write content as JSON to output_file, see write_file
+    :return: The name of the backend that wrote it
+    """
+    return write_file(output_file, lambda f: write_json(content, f, compact, backend))
+
+
+def write_xml_file(content, output_file, namespaces=None):
+    """
+    Write content as NSO XML to output_file, see write_file and write_xml
+    """
+    return write_file(output_file, lambda f: write_xml(content, f, namespaces))
+
+
+def write_file(output_file, write_func):
+    """
+    Call write_func with the binary file to write to output_file, creating the directory if it
+    doesn't exist.
+    The file is only replaced once all of it has been written, so a failed conversion never leaves
+    a partial output file behind
+    """
+    # Get the absolute path, since apparently relative paths sometimes have issues with things?
+    abs_path = os.path.abspath(output_file)
+    abs_dir = os.path.dirname(abs_path)
+    if not os.path.exists(abs_dir):
+        os.makedirs(abs_dir, exist_ok=True)
+
+    tmp_file = "{}.{}.tmp".format(abs_path, os.getpid())
+    try:
+        with open(tmp_file, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+            result = write_func(f)
+        os.replace(tmp_file, abs_path)
+    except BaseException:
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+        raise
+    return result
+
+
+def xml_output_path(output_file):
+    """The XML is written next to the JSON output, with the extension changed to .xml"""
+    return "{}.xml".format(os.path.splitext(output_file)[0])
+
+
+def write_xml(content, f, namespaces=None):
+    """
+    Write the output dict ({'data': {...}}) as XML that NSO can load, into the binary file object f.
+    The keys with a 'module:' prefix get the namespace of that module, lists are written as repeated
+    elements and [None] (empty leaves) as empty elements
+    :param namespaces: {module: namespace}, added to XML_NAMESPACES
+    """
+    writer = _XmlWriter(f, namespaces)
+    writer.write(content)
+    writer.close()
+
+
+class _XmlWriter:
+    def __init__(self, f, namespaces=None):
+        self.namespaces = dict(XML_NAMESPACES)
+        if namespaces:
+            self.namespaces.update(namespaces)
+        self.text = io.TextIOWrapper(f, encoding="utf-8", write_through=False)
+
+    def write(self, content):
+        write = self.text.write
+        write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        write('<config xmlns="{}">\n'.format(NSO_CONFIG_NAMESPACE))
+        data = content.get("data", content) if isinstance(content, dict) else content
+        self._write_children(data, None, 1)
+        write('</config>\n')
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()
+
+    def namespace(self, module):
+        if module not in self.namespaces:
+            # NSO won't load elements in a namespace that was made up, so there's no point writing them
+            raise ValueError("No XML namespace for the YANG module '{}', add it to [xml_namespaces] in "
+                             "the configs".format(module))
+        return self.namespaces[module]
+
+    def _write_children(self, value, module, depth):
+        for key, child in value.items():
+            key = str(key)
+            child_module = module
+            attrs = ""
+            if ":" in key:
+                child_module, key = key.split(":", 1)
+                if child_module != module:
+                    attrs = " xmlns={}".format(quoteattr(self.namespace(child_module)))
+            # Lists are the same element repeated
+            items = child if isinstance(child, list) and child != [None] else [child]
+            for item in items:
+                self._write_element(key, attrs, item, child_module, depth)
+
+    def _write_element(self, name, attrs, value, module, depth):
+        write = self.text.write
+        indent = "  " * depth
+        if isinstance(value, dict):
+            if not value:
+                write("{}<{}{}/>\n".format(indent, name, attrs))
+                return
+            write("{}<{}{}>\n".format(indent, name, attrs))
+            self._write_children(value, module, depth + 1)
+            write("{}</{}>\n".format(indent, name))
+        elif value is None or value == [None]:
+            write("{}<{}{}/>\n".format(indent, name, attrs))
+        else:
+            if isinstance(value, bool):
+                value = "true" if value else "false"
+            value = str(value)
+            # Identities from other modules ('module:identity') need their prefix declared
+            prefix = value.split(":", 1)[0] if ":" in value else None
+            if prefix and (prefix in self.namespaces or prefix == module):
+                attrs += " xmlns:{}={}".format(prefix, quoteattr(self.namespace(prefix)))
+            write("{}<{}{}>{}</{}>\n".format(indent, name, attrs, escape(value), name))
@@ -0,0 +1,122 @@
+"""
+Statistics of the mapping rules run by a converter, for --rule-stats.
+Shows which rules take the time of a conversion and which ones never write anything.
+"""
+import time
+
+# The columns the table can be sorted by, {name: (key, descending)}
+SORT_KEYS = {
+    "index": (lambda s: s.index, False),
+    "elems": (lambda s: s.elems, True),
+    "writes": (lambda s: s.writes, True),
+    "skipped": (lambda s: s.skipped, True),
+    "flags": (lambda s: s.flags_seconds, True),
+    "write": (lambda s: s.write_seconds, True),
+    "total": (lambda s: s.seconds, True)
+}
+
+
+class RuleStats:
+    """
+    The totals of a single MappingRule over every time it ran, index is its index in the first plan it ran in.
+    elems is the number of values looked up (MapElems, or 1 for a rule without a mapping), the ones
+    that were falsy and not written are skipped
+    """
+    __slots__ = ("index", "tosca_path", "flags", "sol6_path", "runs", "elems", "writes",
+                 "flags_seconds", "write_seconds", "seconds")
+
+    def __init__(self, rule):
+        self.index = rule.index
+        self.tosca_path = None if rule.tosca_path is None else str(rule.tosca_path)
+        self.flags = rule.flags
+        self.sol6_path = None if rule.sol6_path is None else str(rule.sol6_path)
+        self.runs = 0
+        self.elems = 0
+        self.writes = 0
+        self.flags_seconds = 0.0
+        self.write_seconds = 0.0
+        self.seconds = 0.0
+
+    @property
+    def skipped(self):
+        return self.elems - self.writes
+
+    def time_flags(self, handle_flags, *args):
+        """Call handle_flags for a value of this rule, counting and timing it"""
+        start = time.perf_counter()
+        try:
+            return handle_flags(*args)
+        finally:
+            self.flags_seconds += time.perf_counter() - start
+            self.elems += 1
+
+    def time_write(self, set_value, *args, **kwargs):
+        """Call set_value to write a value of this rule, counting and timing it"""
+        start = time.perf_counter()
+        try:
+            return set_value(*args, **kwargs)
+        finally:
+            self.write_seconds += time.perf_counter() - start
+            self.writes += 1
+
+    def as_dict(self):
+        return {
+            "index": self.index,
+            "tosca": self.tosca_path,
+            "flags": list(self.flags),
+            "sol6": self.sol6_path,
+            "runs": self.runs,
+            "elems": self.elems,
+            "writes": self.writes,
+            "skipped": self.skipped,
+            "flags_seconds": self.flags_seconds,
+            "write_seconds": self.write_seconds,
+            "seconds": self.seconds
+        }
+
+
+class RuleStatsTable:
+    """
+    The RuleStats of every rule, by its TOSCA path, flags and SOL6 path.
+    The same table can be used for several conversions, the stats of the same rule are added up. The
+    index isn't used for that, the plans of different VNFDs don't have the same rules at the same index
+    """
+    def __init__(self):
+        self.rules = {}
+
+    @staticmethod
+    def key(rule):
+        return (None if rule.tosca_path is None else str(rule.tosca_path), rule.flags,
+                None if rule.sol6_path is None else str(rule.sol6_path))
+
+    def rule(self, rule):
+        key = self.key(rule)
+        stats = self.rules.get(key)
+        if stats is None:
+            stats = self.rules[key] = RuleStats(rule)
+        return stats
+
+    def sorted(self, sort_by="total"):
+        if sort_by not in SORT_KEYS:
+            raise ValueError("Can't sort the rules by '{}', valid columns: {}".format(sort_by, list(SORT_KEYS)))
+        key, descending = SORT_KEYS[sort_by]
+        # Ties are kept in the order the rules first ran
+        return sorted(self.rules.values(), key=key, reverse=descending)
+
+    def as_list(self, sort_by="index"):
+        return [stats.as_dict() for stats in self.sorted(sort_by)]
+
+    def table(self, sort_by="total"):
+        """
+        The stats as a table, one line per rule, with the times in milliseconds
+        """
+        lines = ["{:>5} {:>6} {:>6} {:>7} {:>9} {:>9} {:>9}  {}".format(
+            "Rule", "Elems", "Writes", "Skipped", "Flags ms", "Write ms", "Total ms", "TOSCA -> SOL6 [flags]")]
+        for s in self.sorted(sort_by):
+            flags = " [{}]".format(", ".join(s.flags)) if s.flags else ""
+            lines.append("{:>5} {:>6} {:>6} {:>7} {:>9.3f} {:>9.3f} {:>9.3f}  {} -> {}{}".format(
+                s.index, s.elems, s.writes, s.skipped, s.flags_seconds * 1000, s.write_seconds * 1000,
+                s.seconds * 1000, s.tosca_path, s.sol6_path, flags))
+        never = len([s for s in self.rules.values() if not s.writes])
+        lines.append("{} rules, {} never wrote a value".format(len(self.rules), never))
+        return "\n".join(lines)
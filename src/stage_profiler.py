@@ -0,0 +1,151 @@
+"""
+Timing of the stages of a conversion (reading the configs and the TOSCA, mapping, output, ...),
+for --timings and --profile.
+Each stage records its wall time, how many times it ran and the peak memory allocated while it ran
+(with tracemalloc), the stages can also be run under cProfile.
+"""
+import sys
+import json
+import time
+import cProfile
+import logging
+import tracemalloc
+from contextlib import contextmanager
+log = logging.getLogger(__name__)
+
+# Bumped when the layout of the JSON report changes, so anything reading it can tell
+REPORT_VERSION = 1
+
+
+class StageStats:
+    __slots__ = ("name", "calls", "seconds", "peak_memory")
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        # The most memory allocated during a single call, above what was allocated when it started
+        self.peak_memory = None
+
+    def as_dict(self):
+        return {"name": self.name, "calls": self.calls, "seconds": self.seconds, "peak_memory": self.peak_memory}
+
+
+class StageProfiler:
+    """
+    Records the stages run in stage(), nested stages are named 'parent.child'.
+    Tracing the memory makes the run noticeably slower, so the times are best compared between
+    runs with the same options
+    """
+    def __init__(self, enabled=True, trace_memory=True, profile_file=None):
+        """
+        :param trace_memory: Record the peak memory of the stages with tracemalloc
+        :param profile_file: Run everything between start and stop under cProfile and dump the stats here
+        """
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.profile_file = profile_file
+        self.stages = {}
+        # [name, peak memory so far, memory at the start] of the running stages
+        self._stack = []
+        self._profile = None
+        self._started_tracing = False
+        self._start = None
+        self.total_seconds = None
+
+    def start(self):
+        if not self.enabled:
+            return
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self.profile_file:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._start = time.perf_counter()
+
+    def stop(self):
+        """Stop tracing and profiling, the cProfile stats are written to profile_file"""
+        if not self.enabled or self._start is None:
+            return
+        self.total_seconds = time.perf_counter() - self._start
+        self._start = None
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.profile_file)
+            log.info("Wrote the cProfile stats to {}".format(self.profile_file))
+            self._profile = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if self._stack:
+            name = "{}.{}".format(self._stack[-1][0], name)
+        # Added before it runs so the stages are listed in the order they started
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name)
+        frame = [name, 0, 0]
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for this stage, keep what the stage running it had reached so far
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            frame[2] = current
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+            stats.calls += 1
+            stats.seconds += seconds
+            if tracing:
+                peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+                stats.peak_memory = max(stats.peak_memory or 0, peak - frame[2])
+
+    def report(self, **info):
+        """
+        The stages as a dict that can be written as JSON, in the order they first ran
+        :param info: Anything else to put in the report, i.e. the file that was converted
+        """
+        report = {
+            "version": REPORT_VERSION,
+            "python": "{}.{}.{}".format(*sys.version_info[:3]),
+            "trace_memory": self.trace_memory,
+            "total_seconds": self.total_seconds,
+            "stages": [stats.as_dict() for stats in self.stages.values()]
+        }
+        report.update(info)
+        return report
+
+    def write_report(self, report_file, **info):
+        with open(report_file, 'w') as f:
+            json.dump(self.report(**info), f, indent=2)
+        log.info("Wrote the timing report to {}".format(report_file))
+
+    def summary(self):
+        """The stages as a table, one line per stage"""
+        lines = ["{:<28} {:>6} {:>10} {:>12}".format("Stage", "Calls", "Seconds", "Peak KiB")]
+        for stats in self.stages.values():
+            indent = "  " * stats.name.count(".")
+            peak = "-" if stats.peak_memory is None else "{:.1f}".format(stats.peak_memory / 1024)
+            lines.append("{:<28} {:>6} {:>10.4f} {:>12}".format(indent + stats.name.rsplit(".", 1)[-1],
+                                                              stats.calls, stats.seconds, peak))
+        if self.total_seconds is not None:
+            lines.append("{:<28} {:>6} {:>10.4f}".format("total", "", self.total_seconds))
+        return "\n".join(lines)
+
+
+# Used when nothing is being profiled, the stages cost nothing more than the with statement
+NULL_PROFILER = StageProfiler(enabled=False)
@@ -1,41 +1,87 @@
 import logging
+from functools import lru_cache
 log = logging.getLogger(__name__)
 
 SPLIT_CHAR = ";"
 
 
-def get_path_value(path, cur_dict, must_exist=True, ensure_dict=False, no_msg=False):
+class CompiledPath:
+    """
+    A path that has already been split on SPLIT_CHAR, with the list index segments and the '{}'
+    placeholders found, so none of that has to be redone every time the path is used.
+    Get these from compile_path, they are cached by the path string.
+    """
+    __slots__ = ("path", "segments", "indexes", "placeholders")
+
+    def __init__(self, path):
+        self.path = path
+        self.segments = tuple(path.split(SPLIT_CHAR))
+        # The int value of the segments that are list indexes, None for the keys
+        self.indexes = tuple(int(seg) if seg.isdigit() else None for seg in self.segments)
+        self.placeholders = tuple(i for i, seg in enumerate(self.segments) if seg == "{}")
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __eq__(self, other):
+        if isinstance(other, CompiledPath):
+            return self.path == other.path
+        return self.path == other
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __str__(self):
+        return self.path
+
+    def __repr__(self):
+        return "CompiledPath({!r})".format(self.path)
+
+
+@lru_cache(maxsize=16384)
+def _compile_path(path):
+    return CompiledPath(path)
+
+
+def compile_path(path):
+    """
+    Get the CompiledPath for a path string, an already compiled path is returned as-is
+    """
+    if isinstance(path, CompiledPath):
+        return path
+    return _compile_path(path)
+
+
+def get_path_value(path, cur_dict, must_exist=True, ensure_dict=False, no_msg=False, merge_cache=None):
     """
     topology_template.node_templates.vnf.properties.descriptor_id
     Pass in a path and a dict the path applies to and get the value of the key
+    The path can be a string or a CompiledPath
+
+    When a key is used on a list of dicts they are merged, pass a dict as merge_cache to keep the
+    merged lists in it, so reading through the same list again doesn't merge it again.
+    The same merge_cache can only be used while the lists in cur_dict aren't modified.
     """
-    values = path.split(SPLIT_CHAR)
+    path = compile_path(path)
     cur_context = cur_dict
 
-    for val in values:
-        if val.isdigit() and not isinstance(cur_context, list):
+    for val, index in zip(path.segments, path.indexes):
+        if index is not None and not isinstance(cur_context, list):
             cur_context = [cur_context]
 
         if isinstance(cur_context, list):
-            if not val.isdigit():
-                # Check if all the elements are dicts, if so just merge them
-                merge = True
-                for item in cur_context:
-                    if not isinstance(item, dict):
-                        merge = False
-                        break
-
-                if merge and len(cur_context) > 1:
-                    cur_context = merge_list_of_dicts(cur_context)
+            if index is None:
+                if len(cur_context) > 1:
+                    cur_context = _merge_list_context(cur_context, merge_cache)
                 else:
                     cur_context = cur_context[0]
 
         if cur_context is None:
-            return _path_val_existant(must_exist, no_msg, val, path)
+            return _path_val_existant(must_exist, no_msg, val, path.path)
 
-        if val.isdigit():
+        if index is not None:
             try:
-                cur_context = cur_context[int(val)]
+                cur_context = cur_context[index]
             except IndexError:
                 if must_exist:
                     raise
@@ -43,7 +89,7 @@ def get_path_value(path, cur_dict, must_exist=True, ensure_dict=False, no_msg=Fa
         elif val in cur_context:
             cur_context = cur_context[val]
         else:
-            return _path_val_existant(must_exist, no_msg, val, path)
+            return _path_val_existant(must_exist, no_msg, val, path.path)
 
     if ensure_dict and isinstance(cur_context, list):
         # Merge the list into a dict
@@ -52,6 +98,27 @@ def get_path_value(path, cur_dict, must_exist=True, ensure_dict=False, no_msg=Fa
     return cur_context
 
 
+def _merge_list_context(lst, merge_cache=None):
+    """
+    A key is being used on lst, if it's a list of dicts merge them, otherwise use the first element
+    """
+    if merge_cache is not None:
+        cached = merge_cache.get(id(lst))
+        # The list is kept in the entry so its id can't be given to another list while it's cached
+        if cached is not None and cached[0] is lst and cached[1] == len(lst):
+            return cached[2]
+
+    # Check if all the elements are dicts, if so just merge them
+    for item in lst:
+        if not isinstance(item, dict):
+            return lst[0]
+
+    merged = merge_list_of_dicts(lst)
+    if merge_cache is not None:
+        merge_cache[id(lst)] = (lst, len(lst), merged)
+    return merged
+
+
 def _path_val_existant(must_exist, no_msg, val, path):
     if must_exist:
         raise KeyError("Path '{}' not found in {}".format(val, path))
@@ -61,45 +128,56 @@ def _path_val_existant(must_exist, no_msg, val, path):
         return False
 
 
-def set_path_to(path, cur_dict, value, create_missing=False, list_elem=0):
+def set_path_to(path, cur_dict, value, create_missing=False, list_elem=0, cow=None):
     """
     Sets the value of path inside of cur_dict to value
     If create_missing is set then it will create all the required dicts to make the assignment true
 
     If a list is encountered and the current value is not a number, then the method will
     pick list_elem in the list and continue with that as the context.
+    The path can be a string or a CompiledPath
+    If cow (a CowTree) is given, cur_dict is its root and the dicts and lists on the way are copied
+    instead of changed, see CowTree.set_path
     """
-    values = path.split(SPLIT_CHAR)
+    path = compile_path(path)
+    values = path.segments
+    indexes = path.indexes
     cur_context = cur_dict
     i = 0
     while i < len(values):
-        if values[i].isdigit() and not isinstance(cur_context, list):
+        if indexes[i] is not None and not isinstance(cur_context, list):
             # This does not convert the entry in the dict into a list, just the current value
-            cur_context = [cur_context]
+            cur_context = _created(cow, [cur_context])
             # So, we need to set the new value explicitly
             # Concat the paths up to this point into a full path
             path_to_set = SPLIT_CHAR.join(values[0:i])
             # Use that path to recurse and set the value that we're about to work on in here
             # This will update the dict in our current method, because of how python works
-            set_path_to(path_to_set, cur_dict, cur_context, create_missing=True)
+            set_path_to(path_to_set, cur_dict, cur_context, create_missing=True, cow=cow)
 
         # When we encounter a list, get the list_elem (default the first) and continue
         if isinstance(cur_context, list):
             # If our value is a list index
-            if values[i].isdigit():
+            if indexes[i] is not None:
                 if i == len(values) - 1:
                     try:
-                        cur_context[int(values[i])] = value
+                        cur_context[indexes[i]] = value
                     except IndexError:
-                        list_insert_padding(cur_context, int(values[i]), value)
+                        list_insert_padding(cur_context, indexes[i], value)
                 try:
-                    cur_context = cur_context[int(values[i])]
+                    child = cur_context[indexes[i]]
+                    if cow is not None:
+                        child = cow.own_child(cur_context, indexes[i], child)
+                    cur_context = child
                     i += 1
                 except IndexError:
-                    list_insert_padding(cur_context, int(values[i]), {})
+                    list_insert_padding(cur_context, indexes[i], _created(cow, {}))
             else:
                 if cur_context:
-                    cur_context = cur_context[list_elem]
+                    child = cur_context[list_elem]
+                    if cow is not None:
+                        child = cow.own_child(cur_context, list_elem, child)
+                    cur_context = child
 
         else:
             if values[i] in cur_context:
@@ -110,11 +188,14 @@ def set_path_to(path, cur_dict, value, create_missing=False, list_elem=0):
                 if not cur_context[values[i]] and create_missing:
                     # Look ahead and see if we're going to be using this as a list next iteration
                     # If so, make it a list, otherwise make it a dict
-                    if values[i+1].isdigit():
-                        cur_context[values[i]] = []
+                    if indexes[i+1] is not None:
+                        cur_context[values[i]] = _created(cow, [])
                     else:
-                        cur_context[values[i]] = {}
-                cur_context = cur_context[values[i]]
+                        cur_context[values[i]] = _created(cow, {})
+                child = cur_context[values[i]]
+                if cow is not None:
+                    child = cow.own_child(cur_context, values[i], child)
+                cur_context = child
 
             else:  # Enforce strict structure
                 if create_missing:  # If we want to create the keys as we find they are missing
@@ -122,10 +203,108 @@ def set_path_to(path, cur_dict, value, create_missing=False, list_elem=0):
                     i -= 1  # Put the loop back by 1
                 else:
                     raise KeyError("Specified path/key {} not found in {}"
-                                   .format(values[i], path))
+                                   .format(values[i], path.path))
             i += 1
 
 
+class CowTree:
+    """
+    Copy-on-write layer over a parsed document (e.g. the TOSCA), so the same parsed document can
+    be converted any number of times without a deepcopy.
+
+    Read from root, it starts out sharing everything with the original. Writes go through
+    set_path, or into a node from writable, and only copy the dicts and lists on the way to what
+    is written, so the original is never changed.
+    """
+    def __init__(self, original):
+        self.original = original
+        # {id of a node: (node, its copy)}, the node is kept so its id can't be reused
+        self._copies = {}
+        # {id: node} of the copies and the new nodes, these are the only dicts and lists that are written to
+        self._owned = {}
+        # {id of a node: [(parent, key), ...]} for writable, only built when it's needed
+        self._parents = None
+        self.root = self._copy(original) if isinstance(original, (dict, list)) else original
+
+    def set_path(self, path, value, create_missing=False, list_elem=0):
+        """
+        Same as set_path_to(path, self.root, ...)
+        """
+        set_path_to(path, self.root, value, create_missing=create_missing, list_elem=list_elem, cow=self)
+        self._parents = None
+
+    def own_child(self, parent, key, child):
+        """
+        Make parent[key] (child) writable, parent has to be writable already
+        :return: The child to use from now on
+        """
+        if isinstance(child, (dict, list)) and id(child) not in self._owned:
+            child = self._copy(child)
+            parent[key] = child
+        return child
+
+    def writable(self, node):
+        """
+        Get the copy of a node in the tree that can be written to, the nodes above it are copied too
+        """
+        if id(node) in self._owned:
+            return node
+        if id(node) in self._copies:
+            return self._copies[id(node)][1]
+
+        parents = self._parent_index().get(id(node))
+        if not parents:
+            raise KeyError("{} is not in the tree".format(node))
+        node_copy = self._copy(node)
+        # The same node can be in more than one place (YAML anchors), it stays the same in all of them
+        for parent, key in parents:
+            self.writable(parent)[key] = node_copy
+        return node_copy
+
+    def created(self, node):
+        """
+        Mark a new dict or list that was put in the tree as writable
+        """
+        self._owned[id(node)] = node
+        return node
+
+    def contains(self, node):
+        return node is self.root or id(node) in self._owned or id(node) in self._copies or \
+            id(node) in self._parent_index()
+
+    def _copy(self, node):
+        entry = self._copies.get(id(node))
+        if entry is not None:
+            return entry[1]
+        node_copy = node.copy()
+        self._copies[id(node)] = (node, node_copy)
+        self._owned[id(node_copy)] = node_copy
+        return node_copy
+
+    def _parent_index(self):
+        if self._parents is None:
+            parents = {}
+            stack = [self.root]
+            seen = {id(self.root)}
+            while stack:
+                cur = stack.pop()
+                for key, value in (cur.items() if isinstance(cur, dict) else enumerate(cur)):
+                    if not isinstance(value, (dict, list)):
+                        continue
+                    parents.setdefault(id(value), []).append((cur, key))
+                    if id(value) not in seen:
+                        seen.add(id(value))
+                        stack.append(value)
+            self._parents = parents
+        return self._parents
+
+
+def _created(cow, node):
+    if cow is not None:
+        cow.created(node)
+    return node
+
+
 def list_insert_padding(lst, index, value):
     """
     Like list.insert, excpet if the value of index is greater than the length, it will append
@@ -233,6 +412,80 @@ def get_roots_from_filter(cur_dict, child_key=None, child_value=None, parent_key
         return agg
 
 
+class RootIndex:
+    """
+    Index of the roots that get_roots_from_filter(cur_dict, child_key, child_value) returns,
+    so looking up many identifiers in the same dict doesn't walk all of it every time.
+
+    The index for a child_key is built the first time that key is looked up, in one walk of the
+    dict, and holds the roots for every value of it. After that any lookup for the key is a dict access.
+    If cur_dict is modified the index has to be cleared.
+    """
+    def __init__(self, cur_dict):
+        self.cur_dict = cur_dict
+        self._indexes = {}
+
+    def clear(self):
+        self._indexes = {}
+
+    def get_roots(self, child_key, child_value, user_filter=None, parent_filter=None):
+        """
+        Same as get_roots_from_filter(self.cur_dict, child_key, child_value, ...)
+        """
+        # These cases behave differently in get_roots_from_filter, so leave them to it
+        if not child_key or not child_value or not is_hashable(child_value) or \
+                (isinstance(self.cur_dict, dict) and self.cur_dict.get(child_key, None) == child_value):
+            return get_roots_from_filter(self.cur_dict, child_key, child_value,
+                                         user_filter=user_filter, parent_filter=parent_filter)
+
+        if child_key not in self._indexes:
+            self._indexes[child_key] = self._build_index(child_key)
+
+        roots = [{parent_key: root} if parent_key is not None else root
+                 for parent_key, root in self._indexes[child_key].get(child_value, [])]
+
+        if user_filter:
+            roots = [r for r in roots if user_filter(r)]
+        if parent_filter:
+            roots = [r for r in roots if get_dict_key(r) in parent_filter]
+        return roots
+
+    def _build_index(self, child_key):
+        """
+        Walk the dict the same way get_roots_from_filter does, and record every dict that has
+        child_key, under the value it has.
+        get_roots_from_filter stops at the first match, so a dict nested under a match for the
+        same value is not a root for that value
+        """
+        index = {}
+
+        def walk(cur, parent_key, blocked, is_root=False):
+            for key, value in cur.items():
+                if key == child_key and not is_root and is_hashable(value) and value not in blocked:
+                    index.setdefault(value, []).append((parent_key, cur))
+                    blocked = blocked | {value}
+
+                if isinstance(value, list):
+                    for item in value:
+                        if isinstance(item, dict):
+                            walk(item, None, blocked)
+                elif isinstance(value, dict):
+                    walk(value, key, blocked)
+
+        if isinstance(self.cur_dict, dict):
+            walk(self.cur_dict, None, frozenset(), is_root=True)
+        return index
+
+
+def is_hashable(obj):
+    """Determine whether 'obj' can be hashed."""
+    try:
+        hash(obj)
+    except TypeError:
+        return False
+    return True
+
+
 def get_path_from_filter(cur_item, child_key, child_value):
     """
     Find the first key:value pair that matches and return the path
@@ -275,49 +528,90 @@ def merge_two_dicts(x, y):
 
 
 def merge_list_of_dicts(lst):
-    hold = None
+    """
+    Merge a list of dicts into a new dict, later keys replace earlier ones
+    If any of the elements aren't dicts, lst is returned as-is
+    """
     final = {}
-    if len(lst) % 2 != 0:
-        hold = lst[-1]
-
-    for count, item in enumerate(lst):
+    for item in lst:
         if not isinstance(item, dict):
             return lst
-        final = merge_two_dicts(final, item)
-    if hold:
-        final = merge_two_dicts(final, hold)
+        final.update(item)
+
+    # The last element of an odd length list is held and merged in again at the end
+    if len(lst) % 2 != 0 and lst[-1]:
+        final.update(lst[-1])
     return final
 
 
 def remove_empty_from_dict(d):
-    def _handle_zero(val):
-        """
-        Python treats 0s as False. So return True if we want to keep it
-        We also want to be able to write false values
-        I'm starting to think this method isn't really worth it
-        """
-        if val is 0 or val is False:
-            return True
-        return val
-
-    if type(d) is dict:
-        return dict((k, remove_empty_from_dict(v)) for k, v in d.items() if _handle_zero(v)
-                    and _handle_zero(remove_empty_from_dict(v)))
-    elif type(d) is list:
-        if d is [None]:  # Handle this stupid case, where we want to actually output this
-            return d
-        return [remove_empty_from_dict(v) for v in d if _handle_zero(v) and
-                _handle_zero(remove_empty_from_dict(v))]
-    else:
+    """
+    Return a copy of the dict (or list) without any of the empty values, at any depth.
+    0, False and [None] are kept since those are values we actually want to output.
+
+    This is done in a single pass with an explicit stack, every value is only looked at once
+    """
+    if not _is_container(d):
         return d
 
+    result = {} if type(d) is dict else []
+    # Each entry is (iterator over the children, pruned output, parent's pruned output, key in parent)
+    stack = [(_iter_children(d), result, None, None)]
+    while stack:
+        children, out, parent, key = stack[-1]
+        descend = False
+        for k, v in children:
+            if _is_container(v):
+                # Handle the child first, it is only added to out if it isn't empty afterwards
+                stack.append((_iter_children(v), {} if type(v) is dict else [], out, k))
+                descend = True
+                break
+            if _keep_value(v):
+                if type(out) is dict:
+                    out[k] = v
+                else:
+                    out.append(v)
+        if descend:
+            continue
+
+        stack.pop()
+        if parent is not None and out:
+            if type(parent) is dict:
+                parent[key] = out
+            else:
+                parent.append(out)
+    return result
+
+
+def _is_container(val):
+    """If the value needs to be pruned, [None] is output as-is"""
+    t = type(val)
+    if t is dict:
+        return True
+    return t is list and not (len(val) == 1 and val[0] is None)
+
+
+def _iter_children(val):
+    if type(val) is dict:
+        return iter(val.items())
+    return ((None, v) for v in val)
+
+
+def _keep_value(val):
+    """
+    Python treats 0s as False. So return True if we want to keep it
+    We also want to be able to write false values
+    """
+    if val is False or (type(val) is int and val == 0):
+        return True
+    return bool(val)
+
 
 def key_exists(item, path, strip_first=True):
     try:
         if strip_first:
             item = item[get_dict_key(item)]
-        paths = path.split(SPLIT_CHAR)
-        for p in paths:
+        for p in compile_path(path).segments:
             item = item[p]
     except KeyError:
         return False
@@ -328,11 +622,28 @@ def remove_duplicates(dic, only_keys=True):
     """
     Use a reverse dict to ensure there are no duplicate values
     If only_keys is false, it will return the dict of unique values
+
+    dic is a list of dicts, they are merged with later keys replacing earlier ones.
+    The first key with each value is kept, in the order they were first seen.
     """
+    merged = {}
+    for item in dic:
+        merged.update(item)
+
     result = {}
-    for key, value in merge_list_of_dicts(dic).items():
-        if value not in result.values():
-            result[key] = value
+    seen = set()
+    # Values that can't go in the set are compared the slow way
+    seen_unhashable = []
+    for key, value in merged.items():
+        if is_hashable(value):
+            if value in seen:
+                continue
+            seen.add(value)
+        else:
+            if value in seen_unhashable:
+                continue
+            seen_unhashable.append(value)
+        result[key] = value
     if only_keys:
         return list(result.keys())
     return result
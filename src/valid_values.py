@@ -0,0 +1,48 @@
+"""
+The valid values of the SOL6 fields that only accept some values, from the VALID_*_VAL lists in
+the sol6 config
+"""
+
+
+class ValidValues:
+    """
+    Matches values to a list of valid options.
+    Values and options are compared lowercase with '_' as '-', the first option that matches wins.
+    If fuzzy, an option also matches when either one contains the other.
+    The match for every value is cached, the same values come up for every VDU and CP.
+    """
+    def __init__(self, options, fuzzy=False):
+        self.options = list(options)
+        self.fuzzy = fuzzy
+        # {normalized option: option}, the first one wins if more than one normalize the same
+        self.lookup = {}
+        for opt in self.options:
+            self.lookup.setdefault(ValidValues.normalize(opt), opt)
+        self._matches = {}
+
+    @staticmethod
+    def normalize(val):
+        return val.lower().replace("_", "-")
+
+    def match(self, val):
+        """
+        :return: The valid option for the string val, or None if there isn't one
+        """
+        try:
+            return self._matches[val]
+        except KeyError:
+            pass
+        match = self._find(ValidValues.normalize(val))
+        self._matches[val] = match
+        return match
+
+    def _find(self, tmp_val):
+        if not self.fuzzy:
+            return self.lookup.get(tmp_val)
+        for tmp_opt, opt in self.lookup.items():
+            if tmp_val in tmp_opt or tmp_opt in tmp_val:
+                return opt
+        return None
+
+    def __repr__(self):
+        return "ValidValues({}{})".format(self.options, ", fuzzy" if self.fuzzy else "")
@@ -0,0 +1,95 @@
+"""
+Benchmark for MapElem.format_path on the paths from the esc config
+Run from the repo root with:
+    PYTHONPATH=src python3 test/benchmarks/bench_format_path.py
+"""
+import os
+import sys
+import time
+import toml
+from keys.sol6_keys import PathMaping
+from mapping_v2 import MapElem
+from sol6_config_default import SOL6ConfigDefault
+from utils.dict_utils import SPLIT_CHAR, compile_path
+
+ESC_CONFIG = os.path.join(os.path.dirname(__file__), "..", "..", "config", "config-esc.toml")
+
+
+def legacy_format_path(elem, path, use_value=True):
+    """The version this replaced, it searches for the last '{}' again for every placeholder"""
+    path_list = path.split(SPLIT_CHAR)
+    while "{}" in path_list:
+        index = max(idx for idx, val in enumerate(path_list)
+                    if val == '{}')
+        if elem:
+            val = elem.cur_map if use_value else elem.name
+        else:
+            val = ""
+        if val is not None:
+            path_list[index] = path_list[index].format(val)
+
+        if not elem:
+            break
+
+        elem = elem.parent_map
+
+    return SPLIT_CHAR.join(path_list)
+
+
+def esc_paths():
+    variables = toml.load(ESC_CONFIG)
+    variables.update(toml.loads(SOL6ConfigDefault.config))
+    variables = PathMaping.format_paths(variables)
+    paths = []
+    for table in ("tosca", "sol6"):
+        for key, value in variables[table].items():
+            if "_VAL" not in key and isinstance(value, str):
+                paths.append(value)
+    return paths
+
+
+def map_chains(depth):
+    """Parent chains like the ones run_mapping formats with, including a None value to skip"""
+    chains = [None]
+    for length in range(1, depth + 1):
+        elem = None
+        for level in range(length):
+            elem = MapElem("name{}".format(level), level, parent_map=elem)
+        chains.append(elem)
+    chains.append(MapElem("skip", None, parent_map=chains[-1]))
+    return chains
+
+
+def timed(func, cases, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for elem, path in cases:
+            func(elem, path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    paths = esc_paths()
+    max_placeholders = max(len(compile_path(p).placeholders) for p in paths)
+    cases = [(elem, path) for path in paths for elem in map_chains(max_placeholders)] * 20
+
+    for elem, path in cases:
+        for use_value in (True, False):
+            if MapElem.format_path(elem, path, use_value) != legacy_format_path(elem, path, use_value):
+                print("FAIL: output differs for {} with {}".format(path, elem))
+                return 1
+
+    new = timed(MapElem.format_path, cases)
+    legacy = timed(legacy_format_path, cases)
+    print("{} esc config paths, up to {} placeholders, {} calls".format(
+        len(paths), max_placeholders, len(cases)))
+    print("{:>12} {:>12} {:>10}".format("new (s)", "legacy (s)", "speedup"))
+    print("{:>12.4f} {:>12.4f} {:>9.2f}x".format(new, legacy, legacy / new))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Benchmark for how the conversion scales with the number of connection points
+Run from the repo root with:
+    PYTHONPATH=.:src python3 test/benchmarks/bench_int_cps.py
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from solcon import SolCon
+from sol6_config_default import SOL6ConfigDefault
+from synthetic_tosca import synthetic_vnfd
+
+ESC_CONFIG = os.path.join(os.path.dirname(__file__), "..", "..", "config", "config-esc.toml")
+CPS_PER_VDU = 10
+
+
+def prepared_solcon():
+    args = argparse.Namespace(provider=None, prune=True, output=None, output_silent=True)
+    variables = SolCon.read_configs(ESC_CONFIG, SOL6ConfigDefault.config, sol6_is_file=False,
+                                    use_cache=False)
+    return SolCon.prepared(args, variables)
+
+
+def timed_conversion(solcon, tosca, repeat=3):
+    best = None
+    solcon.tosca_vnf = tosca
+    for _ in range(repeat):
+        start = time.perf_counter()
+        solcon.cnfv = solcon.convert_tosca(None)
+        solcon.format_output()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    # The converter logs a lot for every VDU, that isn't what is being measured here
+    logging.disable(logging.WARNING)
+    solcon = prepared_solcon()
+
+    print("{:>8} {:>8} {:>12} {:>12}".format("cps", "vdus", "convert (s)", "us/cp"))
+    per_cp = {}
+    for num_cps in (10, 100, 1000, 5000):
+        num_vdus = max(1, num_cps // CPS_PER_VDU)
+        tosca = synthetic_vnfd(num_vdus, num_cps // num_vdus)
+        seconds = timed_conversion(solcon, tosca, repeat=3 if num_cps < 5000 else 1)
+        per_cp[num_cps] = seconds / num_cps
+        print("{:>8} {:>8} {:>12.4f} {:>12.1f}".format(num_cps, num_vdus, seconds, per_cp[num_cps] * 1e6))
+
+    # 10 CPs is mostly fixed overhead, so compare from 100 up
+    if per_cp[5000] > 3 * per_cp[100]:
+        print("\nFAIL: conversion time per connection point grows with the number of them")
+        return 1
+    print("\nOK: conversion time scales linearly with the number of connection points")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Benchmark of the whole SolCon pipeline (configs, TOSCA YAML, conversion and output) on synthetic VNFDs
+of a few sizes, with the time of each stage.
+Run from the repo root with:
+    PYTHONPATH=.:src python3 test/benchmarks/bench_pipeline.py
+
+The results can be saved as a baseline with --save-baseline, later runs compared against it with
+--baseline fail if the throughput of any size dropped by more than --threshold. Timings depend on the
+machine, so the baseline has to come from the same one the comparison runs on.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from solcon import SolCon
+from sol6_config_default import SOL6ConfigDefault
+from stage_profiler import StageProfiler
+from synthetic_tosca import synthetic_vnfd, synthetic_vnfd_yaml, node_count
+
+ESC_CONFIG = os.path.join(os.path.dirname(__file__), "..", "..", "config", "config-esc.toml")
+# Bumped when the sizes or what is measured change, baselines from other versions aren't compared
+BASELINE_VERSION = 1
+# (name, synthetic_vnfd arguments)
+SIZES = [
+    ("small", dict(num_vdus=2, cps_per_vdu=4, storages_per_vdu=1, scaling_aspects=1, deltas_per_aspect=1,
+                   placement_groups=1, artifacts_per_vdu=1)),
+    ("medium", dict(num_vdus=20, cps_per_vdu=8, storages_per_vdu=2, scaling_aspects=4, deltas_per_aspect=2,
+                    placement_groups=4, artifacts_per_vdu=2)),
+    ("large", dict(num_vdus=100, cps_per_vdu=10, storages_per_vdu=2, scaling_aspects=10, deltas_per_aspect=3,
+                   placement_groups=10, artifacts_per_vdu=3))
+]
+
+
+def pipeline_args(tosca_file, output_file):
+    """The arguments SolCon.run needs to convert tosca_file to output_file like the command line does"""
+    return argparse.Namespace(file=tosca_file, output=output_file, path_config=ESC_CONFIG,
+                              path_config_sol6=SOL6ConfigDefault.config, config_cache=True, provider=None,
+                              prune=True, compact=False, json_backend="auto", xml=False, output_silent=True,
+                              serve=None, batch=None, jobs=1, timings=None, profile=None, rule_stats=None)
+
+
+def run_pipeline(tosca_file, output_file):
+    """
+    Run the whole conversion once
+    :return: The StageProfiler with the stages of the run
+    """
+    solcon = SolCon.prepared(pipeline_args(tosca_file, output_file), None)
+    # The memory isn't traced, tracemalloc would be most of what is measured
+    solcon.profiler = StageProfiler(trace_memory=False)
+    solcon.profiler.start()
+    try:
+        solcon.run(sol6_config_isfile=False)
+    finally:
+        solcon.profiler.stop()
+    return solcon.profiler
+
+
+def bench_size(name, params, tmp_dir, repeat):
+    """
+    :return: The results of the fastest of repeat runs for one size
+    """
+    tosca_file = os.path.join(tmp_dir, "{}.yaml".format(name))
+    with open(tosca_file, 'w') as f:
+        f.write(synthetic_vnfd_yaml(**params))
+    nodes = node_count(synthetic_vnfd(**params))
+
+    # The first run writes the config cache and fills the caches that are kept between conversions
+    run_pipeline(tosca_file, os.path.join(tmp_dir, "{}.json".format(name)))
+    best = None
+    for _ in range(repeat):
+        profiler = run_pipeline(tosca_file, os.path.join(tmp_dir, "{}.json".format(name)))
+        if best is None or profiler.total_seconds < best.total_seconds:
+            best = profiler
+    return {
+        "params": params,
+        "nodes": nodes,
+        "seconds": best.total_seconds,
+        "nodes_per_second": nodes / best.total_seconds,
+        "stages": {stats.name: stats.seconds for stats in best.stages.values()}
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Print the change in throughput from the baseline for every size
+    :return: The names of the sizes that regressed past threshold
+    """
+    if baseline.get("version") != BASELINE_VERSION:
+        print("\nThe baseline is from another version of the benchmark, not comparing")
+        return []
+    regressed = []
+    print("\n{:<8} {:>14} {:>14} {:>8}".format("size", "baseline n/s", "current n/s", "change"))
+    for name, result in results.items():
+        base = baseline["sizes"].get(name)
+        if base is None or base["params"] != result["params"]:
+            print("{:<8} not in the baseline".format(name))
+            continue
+        change = result["nodes_per_second"] / base["nodes_per_second"] - 1
+        print("{:<8} {:>14.1f} {:>14.1f} {:>+7.1%}".format(name, base["nodes_per_second"],
+                                                           result["nodes_per_second"], change))
+        if change < -threshold:
+            regressed.append(name)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SolCon pipeline on synthetic VNFDs")
+    parser.add_argument('--sizes', nargs='+', choices=[name for name, _ in SIZES],
+                        help="Only run these sizes")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs of each size, the fastest one is kept")
+    parser.add_argument('--baseline', help="Compare the throughput with this baseline JSON")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Fail if the throughput is this fraction below the baseline (default 0.2)")
+    parser.add_argument('--save-baseline', metavar='FILE', help="Write the results to FILE as the new baseline")
+    args = parser.parse_args()
+
+    # The converter logs a lot for every VDU, that isn't what is being measured here
+    logging.disable(logging.WARNING)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, params in SIZES:
+            if args.sizes and name not in args.sizes:
+                continue
+            results[name] = bench_size(name, params, tmp_dir, args.repeat)
+
+    stage_names = list(dict.fromkeys(stage for result in results.values() for stage in result["stages"]))
+    print(("{:<8} {:>6} {:>10} {:>10}" + " {:>10}" * len(stage_names)).format(
+        "size", "nodes", "total (s)", "nodes/s", *[stage.split(".")[-1][:10] for stage in stage_names]))
+    for name, result in results.items():
+        stages = [result["stages"].get(stage, 0) for stage in stage_names]
+        print(("{:<8} {:>6} {:>10.4f} {:>10.1f}" + " {:>10.4f}" * len(stage_names)).format(
+            name, result["nodes"], result["seconds"], result["nodes_per_second"], *stages))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({"version": BASELINE_VERSION, "sizes": results}, f, indent=2)
+        print("\nSaved the baseline to {}".format(args.save_baseline))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(results, json.load(f), args.threshold)
+        if regressed:
+            print("\nFAIL: the throughput of {} is more than {:.0%} below the baseline"
+                  .format(", ".join(regressed), args.threshold))
+            return 1
+        print("\nOK: no size is more than {:.0%} below the baseline".format(args.threshold))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
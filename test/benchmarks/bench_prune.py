@@ -0,0 +1,110 @@
+"""
+Benchmark for dict_utils.remove_empty_from_dict on synthetic SOL6 descriptors
+Run from the repo root with:
+    PYTHONPATH=src python3 test/benchmarks/bench_prune.py
+"""
+import sys
+import time
+from utils.dict_utils import remove_empty_from_dict
+
+
+def legacy_remove_empty_from_dict(d):
+    """The recursive version this replaced, it prunes every child twice"""
+    def _handle_zero(val):
+        if (type(val) is int and val == 0) or val is False:
+            return True
+        return val
+
+    if type(d) is dict:
+        return dict((k, legacy_remove_empty_from_dict(v)) for k, v in d.items() if _handle_zero(v)
+                    and _handle_zero(legacy_remove_empty_from_dict(v)))
+    elif type(d) is list:
+        return [legacy_remove_empty_from_dict(v) for v in d if _handle_zero(v) and
+                _handle_zero(legacy_remove_empty_from_dict(v))]
+    else:
+        return d
+
+
+def synthetic_vnfd(num_vdus, cps_per_vdu=8, depth=4):
+    """
+    A SOL6 shaped dict with int-cpds and scaling deltas, with empty values scattered through it.
+    depth controls how many extra levels of nesting each int-cpd has
+    """
+    def nested(level):
+        if level == 0:
+            return {"value": level, "empty": "", "flag": False}
+        return {"level-{}".format(level): nested(level - 1), "unused": {}}
+
+    vdus = []
+    for v in range(num_vdus):
+        cpds = []
+        for c in range(cps_per_vdu):
+            cpds.append({
+                "id": "vdu{}_nic{}".format(v, c),
+                "layer-protocol": ["etsi-nfv-descriptors:ipv4"],
+                "cisco-etsi-nfvo:interface-id": c,
+                "cisco-etsi-nfvo:management": [None] if c == 0 else "",
+                "additional-sol1-parameters": nested(depth)
+            })
+        vdus.append({"id": "vdu{}".format(v), "int-cpd": cpds, "boot-order": [], "description": None})
+
+    aspects = [{"id": "aspect{}".format(v),
+                "aspect-delta-details": {"deltas": [{"id": "delta", "vdu-delta": [
+                    {"id": "vdu{}".format(v), "number-of-instances": 1}, {}]}]}}
+               for v in range(num_vdus)]
+    return {"vnfd": {"id": "bench", "vdu": vdus, "df": [{"id": "default", "scaling-aspect": aspects}]}}
+
+
+def count_nodes(d):
+    stack = [d]
+    count = 0
+    while stack:
+        cur = stack.pop()
+        count += 1
+        if isinstance(cur, dict):
+            stack.extend(cur.values())
+        elif isinstance(cur, list):
+            stack.extend(cur)
+    return count
+
+
+def timed(func, arg, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    print("Scaling with the number of nodes (depth 4)")
+    print("{:>8} {:>12} {:>12} {:>14}".format("nodes", "new (s)", "legacy (s)", "new us/node"))
+    per_node = []
+    for num_vdus in (10, 25, 62, 100):
+        vnfd = synthetic_vnfd(num_vdus)
+        nodes = count_nodes(vnfd)
+        new = timed(remove_empty_from_dict, vnfd)
+        legacy = timed(legacy_remove_empty_from_dict, vnfd, repeat=1)
+        per_node.append(new / nodes)
+        print("{:>8} {:>12.4f} {:>12.4f} {:>14.3f}".format(nodes, new, legacy, new / nodes * 1e6))
+
+    print("\nScaling with the depth of each int-cpd (10 VDUs)")
+    print("{:>8} {:>8} {:>12} {:>12}".format("depth", "nodes", "new (s)", "legacy (s)"))
+    for depth in (2, 4, 6, 8):
+        vnfd = synthetic_vnfd(10, depth=depth)
+        new = timed(remove_empty_from_dict, vnfd)
+        legacy = timed(legacy_remove_empty_from_dict, vnfd, repeat=1)
+        print("{:>8} {:>8} {:>12.4f} {:>12.4f}".format(depth, count_nodes(vnfd), new, legacy))
+
+    # The time per node should stay about the same from ~1k to 10k+ nodes if pruning is linear
+    if max(per_node) > 3 * min(per_node):
+        print("\nFAIL: pruning time per node is not constant: {}".format(per_node))
+        return 1
+    print("\nOK: pruning scales linearly with the number of nodes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
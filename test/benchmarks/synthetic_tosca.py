@@ -0,0 +1,199 @@
+"""
+Generates synthetic SOL001 TOSCA VNFDs, as the dicts read_tosca_yaml returns, for the benchmarks
+"""
+import yaml
+
+PROVIDER = "cisco"
+VDU_TYPE = "cisco.nodes.nfv.Vdu.Compute"
+CP_TYPE = "cisco.nodes.nfv.VduCp"
+STORAGE_TYPE = "cisco.nodes.nfv.Vdu.VirtualBlockStorage"
+PLACEMENT_GROUP_TYPE = "tosca.groups.nfv.PlacementGroup"
+INPUTS = ("VIM_FLAVOR", "MGMT_IP", "IMAGE")
+
+
+def synthetic_vnfd(num_vdus, cps_per_vdu, ext_cps=2, storages_per_vdu=0, scaling_aspects=0, deltas_per_aspect=1,
+                   placement_groups=0, artifacts_per_vdu=0):
+    """
+    A VNFD with num_vdus VDUs that each have cps_per_vdu connection points
+    The first connection point of each VDU is a management one, and the first ext_cps of those are
+    mapped to external connection points. The rest are on one of a few internal virtual links
+    :param storages_per_vdu: Virtual block storages for each VDU, the first one is the root disk with the image
+    :param scaling_aspects: Scaling aspects, the VDUs are spread over them, each with deltas_per_aspect deltas
+    :param placement_groups: Placement groups the VDUs are spread over, each with an (anti) affinity rule
+    :param artifacts_per_vdu: Day 0 config files for each VDU, with a variable that is an input
+    """
+    nodes = {
+        "vnf": {
+            "type": "cisco.synthetic",
+            "properties": {
+                "descriptor_id": "synthetic-vnfd",
+                "descriptor_version": "1.0",
+                "provider": PROVIDER,
+                "product_name": "Synthetic",
+                "software_version": "1.0",
+                "flavour_id": "default"
+            }
+        }
+    }
+    vdus = []
+    ext_names = []
+    for v in range(num_vdus):
+        vdu = "vdu{}".format(v)
+        vdus.append(vdu)
+        nodes[vdu] = {
+            "type": VDU_TYPE,
+            "properties": {
+                "name": "VDU {}".format(v),
+                "description": "synthetic vdu",
+                "vdu_profile": {"min_number_of_instances": 1, "max_number_of_instances": 2}
+            },
+            "capabilities": {"virtual_compute": {"properties": {
+                "virtual_cpu": {"num_virtual_cpu": 2},
+                "virtual_memory": {"virtual_mem_size": "4 GB"}
+            }}}
+        }
+        _add_storages(nodes, vdu, storages_per_vdu)
+        _add_artifacts(nodes[vdu], artifacts_per_vdu)
+
+        for c in range(cps_per_vdu):
+            cp = "{}_nic{}".format(vdu, c)
+            properties = {"layer_protocols": ["ipv4"]}
+            requirements = [{"virtual_binding": vdu}]
+            if c == 0:
+                properties["management"] = True
+                if len(ext_names) < ext_cps:
+                    ext_names.append(cp)
+            else:
+                requirements.append({"virtual_link": "internal{}".format(c % 4)})
+            nodes[cp] = {"type": CP_TYPE, "properties": properties, "requirements": requirements}
+
+    topology = {
+        "substitution_mappings": {
+            "node_type": "cisco.synthetic",
+            "requirements": [{"virtual_link": [name, "virtual_link"]} for name in ext_names]
+        },
+        "node_templates": nodes
+    }
+    if storages_per_vdu or artifacts_per_vdu:
+        topology["inputs"] = {name: {"type": "string"} for name in INPUTS}
+    policies = _scaling_policies(vdus, scaling_aspects, deltas_per_aspect)
+    if placement_groups:
+        groups, placement_policies = _placement_groups(vdus, placement_groups)
+        topology["groups"] = groups
+        policies += placement_policies
+    if policies:
+        topology["policies"] = policies
+
+    return {
+        "tosca_definitions_version": "tosca_simple_yaml_1_2",
+        "description": "Synthetic VNFD",
+        "topology_template": topology
+    }
+
+
+def synthetic_vnfd_yaml(*args, **kwargs):
+    """synthetic_vnfd as YAML, to be read by read_tosca_yaml"""
+    return yaml.safe_dump(synthetic_vnfd(*args, **kwargs), default_flow_style=False, sort_keys=False)
+
+
+def node_count(tosca):
+    """The number of node templates, policies and groups in a VNFD, the amount of work it is to convert"""
+    topology = tosca["topology_template"]
+    return len(topology["node_templates"]) + len(topology.get("policies", [])) + len(topology.get("groups", {}))
+
+
+def _add_storages(nodes, vdu, count):
+    names = []
+    for s in range(count):
+        name = "{}_storage{}".format(vdu, s)
+        names.append(name)
+        storage = {
+            "type": STORAGE_TYPE,
+            "properties": {"virtual_block_storage_data": {
+                "size_of_storage": "{} GB".format(10 * (s + 1)),
+                "vdu_storage_requirements": {"type": "root" if s == 0 else "ephemeral"}
+            }}
+        }
+        if s == 0:
+            storage["properties"]["sw_image_data"] = {
+                "name": {"get_input": "IMAGE"},
+                "version": "1.0",
+                "checksum": "9af30fce37a4c5c831e095745744d6d2",
+                "container_format": "bare",
+                "disk_format": "qcow2",
+                "min_disk": "2 GB",
+                "size": "2 GB"
+            }
+            storage["artifacts"] = {"sw_image": {"file": "../Images/{}.qcow2".format(vdu)}}
+        nodes[name] = storage
+    if names:
+        nodes[vdu]["properties"]["boot_order"] = names[:1]
+        nodes[vdu]["requirements"] = [{"virtual_storage": name} for name in names]
+
+
+def _add_artifacts(vdu_node, count):
+    if not count:
+        return
+    properties = vdu_node["properties"]
+    properties["configurable_properties"] = {
+        "additional_vnfc_configurable_properties": {"vim_flavor": {"get_input": "VIM_FLAVOR"}}
+    }
+    config_data = {}
+    for a in range(count):
+        config_data["day0_{}.xml".format(a)] = {
+            "file": "../Files/day0_{}.xml".format(a),
+            "variables": {"VAR_{}".format(a): {"get_input": "MGMT_IP"}}
+        }
+    properties["vendor_section"] = {"cisco_esc": {"config_data": config_data}}
+
+
+def _scaling_policies(vdus, scaling_aspects, deltas_per_aspect):
+    """The instantiation levels of every VDU, and the scaling aspects with the deltas of the VDUs in them"""
+    if not scaling_aspects:
+        return []
+    policies = [{"instantiation_levels": {
+        "type": "tosca.policies.nfv.InstantiationLevels",
+        "properties": {"levels": {"default": {"description": "Default level"}}, "default_level": "default"}
+    }}]
+    for vdu in vdus:
+        policies.append({"{}_inst".format(vdu): {
+            "type": "tosca.policies.nfv.VduInstantiationLevels",
+            "properties": {"levels": {"default": {"number_of_instances": 1}}},
+            "targets": [vdu]
+        }})
+
+    aspects = {}
+    for a in range(scaling_aspects):
+        aspect = "aspect{}".format(a)
+        deltas = ["{}_delta{}".format(aspect, d) for d in range(deltas_per_aspect)]
+        aspects[aspect] = {"name": aspect, "description": "scale {}".format(aspect),
+                           "max_scale_level": deltas_per_aspect, "step_deltas": deltas}
+    policies.append({"scaling_aspects": {"type": "tosca.policies.nfv.ScalingAspects",
+                                         "properties": {"aspects": aspects}}})
+
+    for v, vdu in enumerate(vdus):
+        aspect = "aspect{}".format(v % scaling_aspects)
+        deltas = aspects[aspect]["step_deltas"]
+        policies.append({"{}_scaling".format(vdu): {
+            "type": "tosca.policies.nfv.VduScalingAspectDeltas",
+            "properties": {"aspect": aspect,
+                           "deltas": {delta: {"number_of_instances": d + 1} for d, delta in enumerate(deltas)}},
+            "targets": [vdu]
+        }})
+    return policies
+
+
+def _placement_groups(vdus, count):
+    """The VDUs spread over count placement groups, alternating between anti affinity and affinity rules"""
+    groups = {}
+    policies = []
+    for g in range(count):
+        group = "placement_group{}".format(g)
+        groups[group] = {"type": PLACEMENT_GROUP_TYPE, "members": vdus[g::count]}
+        rule = "AntiAffinityRule" if g % 2 == 0 else "AffinityRule"
+        policies.append({"{}_rule".format(group): {
+            "type": "tosca.policies.nfv.{}".format(rule),
+            "properties": {"scope": "nfvi_node" if g % 2 == 0 else "zone"},
+            "targets": [group]
+        }})
+    return groups, policies
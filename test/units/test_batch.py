@@ -0,0 +1,138 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from solcon import SolCon
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+CONFIG = os.path.join(ROOT, "config", "config-esc.toml")
+
+TOSCA = """
+tosca_definitions_version: tosca_simple_yaml_1_2
+topology_template:
+  node_templates:
+    vnf:
+      type: cisco.test
+      properties:
+        descriptor_id: {}
+        provider: cisco
+"""
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+    return path
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_batch(self, batch, output_dir=None, *args):
+        """Run solcon.py in batch mode, the summary is the part of stdout from 'Batch summary'"""
+        cmd = [sys.executable, os.path.abspath(os.path.join(ROOT, "solcon.py")), "-b", batch,
+               "-c", os.path.abspath(CONFIG), "-l", "WARNING"] + list(args)
+        if output_dir:
+            cmd += ["-o", output_dir]
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.abspath(ROOT),
+                                                           os.path.abspath(os.path.join(ROOT, "src"))]))
+        result = subprocess.run(cmd, cwd=self.dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        stdout = result.stdout
+        summary = stdout[stdout.index("Batch summary"):] if "Batch summary" in stdout else ""
+        return result.returncode, summary
+
+    def vnfd_id(self, output):
+        with open(output) as f:
+            return json.load(f)["data"]["etsi-nfv-descriptors:nfv"]["vnfd"]["id"]
+
+    def test_find_by_directory(self):
+        a = write(os.path.join(self.dir, "a.yaml"), "")
+        b = write(os.path.join(self.dir, "b.yml"), "")
+        write(os.path.join(self.dir, "c.json"), "")
+        write(os.path.join(self.dir, "sub", "d.yaml"), "")
+        self.assertEqual(SolCon.find_batch_files(self.dir), [a, b])
+
+    def test_find_by_glob(self):
+        a = write(os.path.join(self.dir, "p1", "vnfd.yaml"), "")
+        b = write(os.path.join(self.dir, "p2", "vnfd.yaml"), "")
+        write(os.path.join(self.dir, "p2", "other.yaml"), "")
+        os.makedirs(os.path.join(self.dir, "p3", "vnfd.yaml"))
+        self.assertEqual(SolCon.find_batch_files(os.path.join(self.dir, "*", "vnfd.yaml")), [a, b])
+        self.assertEqual(SolCon.find_batch_files(os.path.join(self.dir, "none", "*.yaml")), [])
+
+    def test_output_paths(self):
+        self.assertEqual(SolCon.batch_output_path(os.path.join("in", "a.yaml")), os.path.join("in", "a.json"))
+        self.assertEqual(SolCon.batch_output_path(os.path.join("in", "p1", "a.yaml"), "out",
+                                                  base_dir=os.path.abspath("in")),
+                         os.path.join("out", "p1", "a.json"))
+        self.assertEqual(SolCon.find_duplicate_outputs(["a.yaml", "b.yaml", "a.yml"], ["a.json", "b.json", "a.json"]),
+                         [("a.yml", "a.json", "a.yaml")])
+
+    def test_errors_per_file(self):
+        write(os.path.join(self.dir, "in", "a.yaml"), TOSCA.format("vnfd-a"))
+        write(os.path.join(self.dir, "in", "b.yaml"), "topology_template: [")
+        write(os.path.join(self.dir, "in", "c.yaml"), TOSCA.format("vnfd-c"))
+        code, summary = self.run_batch(os.path.join(self.dir, "in"))
+
+        # Scripts can tell that a file failed
+        self.assertEqual(code, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "in", "b.json")))
+        self.assertEqual(self.vnfd_id(os.path.join(self.dir, "in", "c.json")), "vnfd-c")
+
+        lines = summary.splitlines()
+        self.assertTrue(lines[0].startswith("Batch summary: 2/3 converted"))
+        self.assertTrue(lines[1].strip().startswith("OK"))
+        self.assertTrue(lines[2].strip().startswith("FAIL"))
+        self.assertIn("b.yaml", lines[2])
+        self.assertTrue(lines[3].strip().startswith("OK"))
+
+    def test_keeps_directories(self):
+        write(os.path.join(self.dir, "pkgs", "p1", "vnfd.yaml"), TOSCA.format("vnfd-1"))
+        write(os.path.join(self.dir, "pkgs", "p2", "vnfd.yaml"), TOSCA.format("vnfd-2"))
+        out_dir = os.path.join(self.dir, "out")
+        code, _ = self.run_batch(os.path.join(self.dir, "pkgs", "*", "vnfd.yaml"), out_dir)
+
+        self.assertEqual(code, 0)
+        self.assertEqual(self.vnfd_id(os.path.join(out_dir, "p1", "vnfd.json")), "vnfd-1")
+        self.assertEqual(self.vnfd_id(os.path.join(out_dir, "p2", "vnfd.json")), "vnfd-2")
+
+    def test_duplicate_outputs(self):
+        write(os.path.join(self.dir, "in", "vnfd.yaml"), TOSCA.format("vnfd-a"))
+        write(os.path.join(self.dir, "in", "vnfd.yml"), TOSCA.format("vnfd-b"))
+        code, summary = self.run_batch(os.path.join(self.dir, "in"))
+
+        self.assertEqual(code, 1)
+        self.assertTrue(summary.startswith("Batch summary: 0/2 converted"))
+        self.assertIn("also the output of", summary)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "in", "vnfd.json")))
+
+    def test_jobs(self):
+        for name in ("a", "c", "d", "e"):
+            write(os.path.join(self.dir, "in", "{}.yaml".format(name)), TOSCA.format("vnfd-" + name))
+        write(os.path.join(self.dir, "in", "b.yaml"), "topology_template: [")
+        batch = os.path.join(self.dir, "in")
+        out1, out2 = os.path.join(self.dir, "out1"), os.path.join(self.dir, "out2")
+        code1, serial = self.run_batch(batch, out1, "-j", "1")
+        code2, parallel = self.run_batch(batch, out2, "-j", "2")
+
+        self.assertEqual((code1, code2), (1, 1))
+        # The same files in the same order with the same results, only the times and outputs differ
+        lines1, lines2 = serial.splitlines()[1:], parallel.splitlines()[1:]
+        self.assertEqual([line.split()[0] for line in lines2], ["OK", "FAIL", "OK", "OK", "OK"])
+        self.assertEqual([line.split()[0] for line in lines2], [line.split()[0] for line in lines1])
+        self.assertEqual([line.split()[2] for line in lines2], [line.split()[2] for line in lines1])
+        self.assertEqual(lines2[1].split(":", 1)[1], lines1[1].split(":", 1)[1])
+        self.assertEqual(sorted(os.listdir(out2)), ["a.json", "c.json", "d.json", "e.json"])
+        for name in os.listdir(out1):
+            with open(os.path.join(out1, name), 'rb') as f1, open(os.path.join(out2, name), 'rb') as f2:
+                self.assertEqual(f1.read(), f2.read(), name)
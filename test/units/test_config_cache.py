@@ -0,0 +1,67 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import config_cache
+from src.sol6_config_default import SOL6ConfigDefault
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+
+class TestConfigCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.config = os.path.join(self.dir, "config-esc.toml")
+        shutil.copy(os.path.join(ROOT, "config", "config-esc.toml"), self.config)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def load(self, use_cache=True):
+        return config_cache.load_variables(self.config, SOL6ConfigDefault.config, sol6_is_file=False,
+                                           use_cache=use_cache)
+
+    def test_same_as_uncached(self):
+        uncached = self.load(use_cache=False)
+        self.assertFalse(os.path.exists(config_cache.cache_path(self.config)))
+        self.assertEqual(self.load(), uncached)
+        self.assertTrue(os.path.exists(config_cache.cache_path(self.config)))
+        self.assertEqual(self.load(), uncached)
+
+    def test_paths_resolved(self):
+        variables = self.load()
+        self.assertEqual(variables["tosca"]["node_templates"], "topology_template;node_templates")
+
+    def test_invalidated_on_change(self):
+        self.load()
+        with open(self.config) as f:
+            config = f.read()
+        with open(self.config, 'w') as f:
+            f.write(config.replace('providers=["cisco", "mavenir"]', 'providers=["cisco", "mavenir", "test"]'))
+        self.assertEqual(self.load()["providers"], ["cisco", "mavenir", "test"])
+
+    def test_invalidated_on_resolver_change(self):
+        cache_file = config_cache.cache_path(self.config)
+        self.load()
+        with open(cache_file, 'rb') as f:
+            key = pickle.load(f)["key"]
+        version = config_cache.resolver_version
+        try:
+            config_cache.resolver_version = lambda: "changed"
+            # The old cache doesn't match, so it's replaced
+            self.assertEqual(self.load(), self.load(use_cache=False))
+            with open(cache_file, 'rb') as f:
+                self.assertNotEqual(pickle.load(f)["key"], key)
+        finally:
+            config_cache.resolver_version = version
+
+    def test_resolver_version(self):
+        self.assertEqual(len(config_cache.RESOLVER_MODULES), 3)
+        self.assertEqual(config_cache.resolver_version(), config_cache.resolver_version())
+
+    def test_corrupt_cache(self):
+        with open(config_cache.cache_path(self.config), 'wb') as f:
+            f.write(b"not a pickle")
+        self.assertEqual(self.load(), self.load(use_cache=False))
@@ -0,0 +1,113 @@
+import argparse
+import hashlib
+import os
+import threading
+import unittest
+from urllib.error import HTTPError
+from solcon import SolCon
+from conversion_server import ConversionServer, request_conversion
+from src.sol6_config_default import SOL6ConfigDefault
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+TOSCA = """
+tosca_definitions_version: tosca_simple_yaml_1_2
+topology_template:
+  node_templates:
+    vnf:
+      type: cisco.test
+      properties:
+        descriptor_id: server-vnfd
+        provider: cisco
+"""
+# The conversion of this one writes derived values (get_input, sw image, day0) for the TOSCA
+DERIVED_TOSCA = """
+tosca_definitions_version: tosca_simple_yaml_1_2
+topology_template:
+  inputs:
+    IMAGE:
+      type: string
+    MGMT_IP:
+      type: string
+  node_templates:
+    vnf:
+      type: cisco.test
+      properties:
+        descriptor_id: cached-vnfd
+        provider: cisco
+    vdu0:
+      type: cisco.nodes.nfv.Vdu.Compute
+      properties:
+        name: VDU 0
+        vendor_section:
+          cisco_esc:
+            config_data:
+              day0.xml:
+                file: ../Files/day0.xml
+                variables:
+                  MGMT:
+                    get_input: MGMT_IP
+      requirements:
+      - virtual_storage: vdu0_storage
+    vdu0_storage:
+      type: cisco.nodes.nfv.Vdu.VirtualBlockStorage
+      properties:
+        virtual_block_storage_data:
+          size_of_storage: 10 GB
+        sw_image_data:
+          name:
+            get_input: IMAGE
+          checksum: 9af30fce37a4c5c831e095745744d6d2
+          container_format: bare
+          disk_format: qcow2
+"""
+
+
+class TestConversionServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        args = argparse.Namespace(provider=None, prune=True, output=None, output_silent=True)
+        variables = SolCon.read_configs(os.path.join(ROOT, "config", "config-esc.toml"),
+                                        SOL6ConfigDefault.config, sol6_is_file=False, use_cache=False)
+        cls.server = ConversionServer(("127.0.0.1", 0), SolCon.prepared(args, variables))
+        cls.url = "http://127.0.0.1:{}".format(cls.server.server_address[1])
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_convert(self):
+        output, latency = request_conversion(self.url, TOSCA)
+        vnfd = output["data"]["etsi-nfv-descriptors:nfv"]["vnfd"]
+        self.assertEqual(vnfd["id"], "server-vnfd")
+        self.assertGreaterEqual(latency, 0)
+
+    def test_repeated_convert(self):
+        first, _ = request_conversion(self.url, TOSCA)
+        second, _ = request_conversion(self.url, TOSCA, provider="cisco")
+        self.assertEqual(first, second)
+
+    def test_parse_cache(self):
+        hits = self.server.metrics.parse_cache_hits
+        first, _ = request_conversion(self.url, TOSCA)
+        second, _ = request_conversion(self.url, TOSCA)
+        self.assertEqual(first, second)
+        self.assertGreater(self.server.metrics.parse_cache_hits, hits)
+
+    def test_parse_cache_unchanged(self):
+        data = DERIVED_TOSCA.encode("utf-8")
+        first, _ = request_conversion(self.url, data)
+        second, _ = request_conversion(self.url, data)
+        self.assertEqual(first, second)
+        cached = self.server.parsed[hashlib.sha256(data).hexdigest()]
+        self.assertEqual(cached, SolCon.parse_tosca_yaml(data))
+
+    def test_invalid_yaml(self):
+        with self.assertRaises(HTTPError) as e:
+            request_conversion(self.url, "foo: [")
+        self.assertEqual(e.exception.code, 400)
+        self.assertGreaterEqual(self.server.metrics.errors, 1)
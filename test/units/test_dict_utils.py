@@ -0,0 +1,208 @@
+import unittest
+from mapping_v2 import MapElem
+from utils.dict_utils import remove_empty_from_dict, get_roots_from_filter, RootIndex, \
+    compile_path, get_path_value, set_path_to, key_exists, remove_duplicates, \
+    merge_list_of_dicts, CowTree
+
+
+class TestRemoveEmpty(unittest.TestCase):
+
+    def test_removes_empty_values(self):
+        d = {"a": "", "b": None, "c": {}, "d": [], "e": "value"}
+        self.assertEqual(remove_empty_from_dict(d), {"e": "value"})
+
+    def test_keeps_zero_and_false(self):
+        d = {"a": 0, "b": False, "c": [0, False, None]}
+        self.assertEqual(remove_empty_from_dict(d), {"a": 0, "b": False, "c": [0, False]})
+
+    def test_keeps_null_list(self):
+        d = {"management": [None], "empty": [None, None]}
+        self.assertEqual(remove_empty_from_dict(d), {"management": [None]})
+
+    def test_removes_nested_empty(self):
+        d = {"a": {"b": {"c": {"d": ""}}, "e": [{}, {"f": []}]}, "g": [1, {"h": 2, "i": ""}]}
+        self.assertEqual(remove_empty_from_dict(d), {"g": [1, {"h": 2}]})
+
+    def test_keeps_order(self):
+        d = {"z": 1, "a": {"x": "", "y": 2}, "m": 3}
+        self.assertEqual(list(remove_empty_from_dict(d).keys()), ["z", "a", "m"])
+
+    def test_does_not_modify_input(self):
+        d = {"a": {"b": ""}, "c": [None, 1]}
+        remove_empty_from_dict(d)
+        self.assertEqual(d, {"a": {"b": ""}, "c": [None, 1]})
+
+    def test_deep_nesting(self):
+        # Deeper than the recursion limit
+        d = cur = {}
+        for _ in range(5000):
+            cur["next"] = {"value": 1}
+            cur = cur["next"]
+        pruned = remove_empty_from_dict(d)
+        for _ in range(5000):
+            pruned = pruned["next"]
+        self.assertEqual(pruned, {"value": 1})
+
+
+class TestRootIndex(unittest.TestCase):
+    tosca = {
+        "topology_template": {
+            "node_templates": {
+                "c1": {"type": "vdu", "properties": {"nested": {"type": "vdu"}}},
+                "c1_nic0": {"type": "cp"},
+                "s1": {"type": "vdu"}
+            },
+            "policies": [
+                {"scaling": {"type": "deltas", "properties": {"aspect": "a1"}}},
+                {"type": "cp"}
+            ]
+        }
+    }
+
+    def test_same_as_filter(self):
+        index = RootIndex(self.tosca)
+        for key, value in [("type", "vdu"), ("type", "cp"), ("type", "deltas"), ("aspect", "a1"),
+                           ("type", "missing")]:
+            self.assertEqual(index.get_roots(key, value), get_roots_from_filter(self.tosca, key, value))
+
+    def test_filters(self):
+        index = RootIndex(self.tosca)
+        self.assertEqual(index.get_roots("type", "vdu", parent_filter=["s1"]), [{"s1": {"type": "vdu"}}])
+        self.assertEqual(index.get_roots("type", "vdu", user_filter=lambda r: "c1" in r),
+                         [{"c1": self.tosca["topology_template"]["node_templates"]["c1"]}])
+
+    def test_clear(self):
+        tosca = {"nodes": {"a": {"type": "vdu"}}}
+        index = RootIndex(tosca)
+        self.assertEqual(len(index.get_roots("type", "vdu")), 1)
+        tosca["nodes"]["b"] = {"type": "vdu"}
+        index.clear()
+        self.assertEqual(len(index.get_roots("type", "vdu")), 2)
+
+
+class TestCompiledPath(unittest.TestCase):
+
+    def test_compile(self):
+        path = compile_path("a;0;{};b")
+        self.assertEqual(path.segments, ("a", "0", "{}", "b"))
+        self.assertEqual(path.indexes, (None, 0, None, None))
+        self.assertEqual(path.placeholders, (2,))
+        self.assertIs(compile_path("a;0;{};b"), path)
+        self.assertIs(compile_path(path), path)
+
+    def test_same_as_string(self):
+        d = {"a": [{"b": {"c": 1}}, {"b": {"c": 2}}]}
+        for path in ["a;1;b;c", "a;b", "a;0"]:
+            self.assertEqual(get_path_value(compile_path(path), d), get_path_value(path, d))
+        self.assertTrue(key_exists({"root": d}, compile_path("a")))
+
+        d1, d2 = {}, {}
+        set_path_to("x;0;y", d1, 5, create_missing=True)
+        set_path_to(compile_path("x;0;y"), d2, 5, create_missing=True)
+        self.assertEqual(d1, d2)
+
+    def test_index_on_dict(self):
+        # An index used on a dict treats it as a list of one, i.e. delta names like '00'
+        d = {"a": {"b": 1}}
+        self.assertEqual(get_path_value("a;0;b", d), 1)
+        self.assertFalse(get_path_value("a;1;b", d, must_exist=False))
+        self.assertEqual(d, {"a": {"b": 1}})
+
+
+class TestFormatPath(unittest.TestCase):
+
+    def test_fills_from_parent_chain(self):
+        elem = MapElem("c1_nic0", 0, parent_map=MapElem("c1", 1))
+        self.assertEqual(MapElem.format_path(elem, "vdu;{};int-cpd;{};id"), "vdu;1;int-cpd;0;id")
+        self.assertEqual(MapElem.format_path(elem, "vdu;{};int-cpd;{};id", use_value=False),
+                         "vdu;c1;int-cpd;c1_nic0;id")
+
+    def test_none_skips_to_parent(self):
+        elem = MapElem("skip", None, parent_map=MapElem("c1", 1))
+        self.assertEqual(MapElem.format_path(elem, "vdu;{};id"), "vdu;1;id")
+
+    def test_missing_parent_blanks(self):
+        self.assertEqual(MapElem.format_path(MapElem("c1", 1), "a;{};b;{}"), "a;;b;1")
+        self.assertEqual(MapElem.format_path(None, "a;b"), "a;b")
+
+
+class TestRemoveDuplicates(unittest.TestCase):
+
+    def test_first_seen_order(self):
+        flavors = [{"c1": "flav_a"}, {"s1": "flav_b"}, {"s2": "flav_a"}, {"s3": "flav_c"}]
+        self.assertEqual(remove_duplicates(flavors), ["c1", "s1", "s3"])
+        self.assertEqual(list(remove_duplicates(flavors, only_keys=False).items()),
+                         [("c1", "flav_a"), ("s1", "flav_b"), ("s3", "flav_c")])
+
+    def test_later_keys_replace(self):
+        self.assertEqual(remove_duplicates([{"a": 1}, {"b": 2}, {"a": 2}], only_keys=False), {"a": 2})
+
+    def test_unhashable_values(self):
+        self.assertEqual(remove_duplicates([{"a": [1]}, {"b": [1]}, {"c": {"x": 1}}]), ["a", "c"])
+
+
+class TestMergeListOfDicts(unittest.TestCase):
+
+    def test_merge(self):
+        lst = [{"a": 1}, {"b": 2}, {"a": 3}]
+        self.assertEqual(list(merge_list_of_dicts(lst).items()), [("a", 3), ("b", 2)])
+        self.assertEqual(lst, [{"a": 1}, {"b": 2}, {"a": 3}])
+
+    def test_not_dicts(self):
+        lst = [{"a": 1}, "b"]
+        self.assertIs(merge_list_of_dicts(lst), lst)
+
+    def test_merge_cache(self):
+        requirements = [{"virtual_binding": "c1"}, {"virtual_link": "internal"}]
+        tosca = {"c1_nic0": {"requirements": requirements}}
+        cache = {}
+        for _ in range(2):
+            self.assertEqual(get_path_value("c1_nic0;requirements;virtual_link", tosca, merge_cache=cache),
+                             "internal")
+        self.assertEqual(len(cache), 1)
+        # Changing the length of the list is noticed
+        requirements.append({"virtual_link": "other"})
+        self.assertEqual(get_path_value("c1_nic0;requirements;virtual_link", tosca, merge_cache=cache), "other")
+
+
+class TestCowTree(unittest.TestCase):
+
+    @staticmethod
+    def tosca():
+        return {"node_templates": {"c1": {"properties": {"name": "c1"}},
+                                   "c2": {"properties": {"name": "c2"}}},
+                "inputs": [{"a": 1}, {"b": 2}]}
+
+    def test_set_path(self):
+        original = self.tosca()
+        tree = CowTree(original)
+        tree.set_path("node_templates;c1;properties;custom_id", "vdu::c1", create_missing=True)
+        tree.set_path("inputs;1;b", 3)
+        self.assertEqual(original, self.tosca())
+        self.assertEqual(tree.root["node_templates"]["c1"]["properties"],
+                         {"name": "c1", "custom_id": "vdu::c1"})
+        self.assertEqual(tree.root["inputs"], [{"a": 1}, {"b": 3}])
+        # Everything that wasn't written to is shared
+        self.assertIs(tree.root["node_templates"]["c2"], original["node_templates"]["c2"])
+        self.assertIs(tree.root["inputs"][0], original["inputs"][0])
+
+    def test_same_as_set_path_to(self):
+        paths = ["node_templates;c3;properties;name", "inputs;3;c", "node_templates;c1;0;name"]
+        for path in paths:
+            expected = self.tosca()
+            set_path_to(path, expected, "v", create_missing=True)
+            tree = CowTree(self.tosca())
+            tree.set_path(path, "v", create_missing=True)
+            self.assertEqual(tree.root, expected)
+            self.assertEqual(tree.original, self.tosca())
+
+    def test_writable(self):
+        original = self.tosca()
+        tree = CowTree(original)
+        props = original["node_templates"]["c2"]["properties"]
+        self.assertTrue(tree.contains(props))
+        self.assertFalse(tree.contains({"c2": props}))
+        tree.writable(props)["name"] = "changed"
+        self.assertEqual(tree.root["node_templates"]["c2"]["properties"]["name"], "changed")
+        self.assertIs(tree.writable(props), tree.root["node_templates"]["c2"]["properties"])
+        self.assertEqual(original, self.tosca())
@@ -0,0 +1,56 @@
+import json
+import unittest
+from mapping_v2 import MapElem, MapList
+from mapping_plan import MappingPlan, MappingRule
+from utils.dict_utils import CompiledPath
+
+
+def build_plan(vdu_count=2):
+    plan = MappingPlan()
+    vdus = MapList(MapElem("c{}".format(i), i) for i in range(vdu_count))
+    plan.add((("topology_template;node_templates;vnf;properties;descriptor_id", ""), "vnfd;id"))
+    plan.add((("topology_template;node_templates;{};properties;name", ("KSV", "", "KSV")),
+              ["vnfd;vdu;{};name", vdus]))
+    return plan
+
+
+class TestMappingPlan(unittest.TestCase):
+
+    def test_rules(self):
+        plan = build_plan()
+        self.assertEqual(len(plan), 2)
+        first, second = plan
+        self.assertIsInstance(first.tosca_path, CompiledPath)
+        self.assertFalse(first.has_mapping)
+        self.assertEqual(first.flags, ())
+        self.assertTrue(second.has_mapping)
+        self.assertEqual(second.flags, ("KSV",))
+        self.assertEqual(second.index, 1)
+
+    def test_normalize_flags(self):
+        self.assertEqual(MappingRule.normalize_flags("A"), ("A",))
+        self.assertEqual(MappingRule.normalize_flags(("A", "", "B", "A")), ("A", "B"))
+
+    def test_dumps(self):
+        rules = json.loads(build_plan().dumps())
+        self.assertEqual(rules[1]["sol6"], "vnfd;vdu;{};name")
+        self.assertEqual(rules[1]["mapping"], [[["c0", 0]], [["c1", 1]]])
+        self.assertIn("vnfd;vdu;{};name x2 [KSV]", build_plan().describe())
+
+    def test_diff(self):
+        self.assertEqual(MappingPlan.diff(build_plan(), build_plan()), [])
+        diff = MappingPlan.diff(build_plan(), build_plan(3).dumps())
+        self.assertTrue(any(line.startswith("+") and "c2" in line for line in diff))
+
+    def test_decode_flags(self):
+        plan = MappingPlan({"KSV": "key_as_value", "NUMBERS": "only_number", "NUMBERSFLOAT": "only_number"})
+        plan.add((("a;b", ("KSV", "UNKNOWN")), "c;d"))
+        plan.add((("a;c", "NUMBERSFLOAT"), "c;e"))
+        plan.add((("a;d", ("UNKNOWN", "KSV")), "c;f"))
+        self.assertEqual(plan.options_type._fields, ("key_as_value", "only_number"))
+        self.assertTrue(plan[0].options.key_as_value)
+        self.assertFalse(plan[0].options.only_number)
+        self.assertTrue(plan[1].options.only_number)
+        self.assertEqual(plan.decode_flags(()), (False, False))
+        with self.assertRaises(AttributeError):
+            plan[0].options.key_as_value = False
@@ -0,0 +1,53 @@
+import unittest
+from mapping_v2 import MapElem, MapList, V2Mapping
+from keys.sol6_keys import V2MapBase
+
+
+class TestMapList(unittest.TestCase):
+
+    def test_first_wins(self):
+        first = MapElem("c1", 0)
+        maps = MapList([first, MapElem("c2", 1), MapElem("c1", 2)])
+        self.assertIs(maps.get_name("c1"), first)
+        self.assertIs(MapElem.get_mapping_name(maps, "c1"), first)
+        self.assertIsNone(maps.get_name("c3"))
+
+    def test_index_follows_changes(self):
+        maps = MapList([MapElem("c1", 0)])
+        self.assertIsNone(maps.get_name("c2"))
+        maps.append(MapElem("c2", 1))
+        self.assertEqual(maps.get_name("c2").cur_map, 1)
+        maps.insert(0, MapElem("c2", 5))
+        self.assertEqual(maps.get_name("c2").cur_map, 5)
+        del maps[0]
+        self.assertEqual(maps.get_name("c2").cur_map, 1)
+        self.assertIsInstance(maps + [MapElem("c3", 2)], MapList)
+
+    def test_map_ints_parents(self):
+        vdus = [MapElem("c1", 0), MapElem("c2", 1)]
+        result = V2Mapping.map_ints(["c2", "c1", "c3"], 0, parent_map=vdus)
+        self.assertIsInstance(result, MapList)
+        self.assertEqual([m.parent_map for m in result], [vdus[1], vdus[0], None])
+
+        result = V2Mapping.map_ints(["a", "b"], 0, value_map=MapElem.basic_map_list(2))
+        self.assertEqual([m.parent_map.cur_map for m in result], [0, 1])
+
+    def test_parent_match(self):
+        parents = [MapElem("apple", 0), MapElem("banana", 1)]
+        result = V2Mapping.parent_match(["a", "b"], parent_map=parents,
+                                        value_dict={"a": "apple", "b": "banana"})
+        self.assertEqual([m.parent_map for m in result], parents)
+
+
+class TestPartitionCps(unittest.TestCase):
+
+    def test_partition(self):
+        cps = MapList(MapElem(name, i) for i, name in enumerate(["c1_nic0", "c1_nic1", "s1_nic0", "s1_nic1"]))
+        groups = V2MapBase.partition_cps(cps, ["s1_nic0", "c1_nic0", "missing"], ["c1_nic0", "c1_nic1"])
+        names = {k: [m.name for m in v] for k, v in groups._asdict().items()}
+        self.assertEqual(names, {
+            "external": ["c1_nic0", "s1_nic0"],
+            "internal": ["c1_nic1", "s1_nic1"],
+            "mgmt": ["c1_nic0"],
+            "orch": ["s1_nic0"]
+        })
@@ -0,0 +1,126 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import argparse
+import unittest
+from contextlib import redirect_stdout
+from xml.etree import ElementTree
+import output_writer
+from solcon import SolCon
+
+CONTENT = {"data": {"etsi-nfv-descriptors:nfv": {"vnfd": [{"id": "vnfd", "vdu": [{"id": "c1", "count": 0},
+                                                                                 {"id": "c2", "flag": None}]}]}}}
+# Floats that json writes with an exponent
+FLOATS = {"large": [1e16, -2.5e20, 9999999999999998.0], "small": 1e-7, 1e17: "key", "normal": [0.0, 1e-4, 0.5]}
+
+
+class TestOutputWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.dir, "out", "vnfd.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_same_as_dumps(self):
+        for name in output_writer.JSON_BACKENDS:
+            for content in (CONTENT, {"unicode": "caf\u00e9", 1: 2.5}, {"big": 2 ** 70}, FLOATS,
+                            {"nan": float("nan"), "inf": [float("inf"), -float("inf")]}):
+                f = io.BytesIO()
+                output_writer.write_json(content, f, backend=output_writer.get_json_backend(name))
+                self.assertEqual(f.getvalue().decode("utf-8"), json.dumps(content, indent=2), name)
+
+    def test_compact(self):
+        for name in output_writer.JSON_BACKENDS:
+            f = io.BytesIO()
+            output_writer.write_json(CONTENT, f, compact=True, backend=output_writer.get_json_backend(name))
+            self.assertEqual(f.getvalue().decode("utf-8"), json.dumps(CONTENT, separators=(",", ":")), name)
+
+    def test_orjson_fallback(self):
+        if "orjson" not in output_writer.JSON_BACKENDS:
+            self.skipTest("orjson is not installed")
+        backend = output_writer.get_json_backend("orjson")
+        self.assertEqual(output_writer.write_json(CONTENT, io.BytesIO(), backend=backend), "orjson")
+        self.assertEqual(output_writer.write_json({"id": 0.5}, io.BytesIO(), backend=backend), "orjson")
+        for content in (FLOATS, {"large": [1e16]}, {"small": 1e-7}, {1e17: "key"},
+                        {"nan": float("nan")}, {"inf": [{"value": float("inf")}]}):
+            self.assertEqual(output_writer.write_json(content, io.BytesIO(), backend=backend), "json", content)
+
+    def test_backends(self):
+        self.assertEqual(output_writer.get_json_backend("json").name, "json")
+        self.assertIn(output_writer.get_json_backend().name, output_writer.JSON_BACKENDS)
+        with self.assertRaises(ValueError):
+            output_writer.get_json_backend("not a backend")
+
+    def test_write_file(self):
+        output_writer.write_json_file(CONTENT, self.output)
+        with open(self.output) as f:
+            self.assertEqual(f.read(), json.dumps(CONTENT, indent=2))
+        self.assertEqual(os.listdir(os.path.dirname(self.output)), ["vnfd.json"])
+
+    def test_text_stdout(self):
+        # stdout without a binary buffer, like when it is redirected in the same process
+        args = argparse.Namespace(prune=False, output=None, output_silent=False, compact=False,
+                                  json_backend="auto", xml=False)
+        solcon = SolCon.prepared(args, None)
+        solcon.cnfv = CONTENT["data"]["etsi-nfv-descriptors:nfv"]
+        with redirect_stdout(io.StringIO()) as out:
+            solcon.output()
+        self.assertEqual(out.getvalue(), json.dumps(CONTENT, indent=2))
+
+    def test_failed_write_keeps_output(self):
+        output_writer.write_json_file(CONTENT, self.output)
+        with self.assertRaises(TypeError):
+            output_writer.write_json_file({"not json": object()}, self.output)
+        with open(self.output) as f:
+            self.assertEqual(json.load(f), CONTENT)
+        self.assertEqual(os.listdir(os.path.dirname(self.output)), ["vnfd.json"])
+
+    def test_xml(self):
+        content = {"data": {"etsi-nfv-descriptors:nfv": {"vnfd": [{
+            "id": "vnfd <1>", "vdu": [{"id": "c1", "cisco-etsi-nfvo:management": [None], "count": 0},
+                                      {"id": "c2", "layer-protocol": "etsi-nfv-descriptors:ipv4",
+                                       "other:param": {"value": True}}]}]}}}
+        xml_file = output_writer.xml_output_path(self.output)
+        self.assertTrue(xml_file.endswith("vnfd.xml"))
+        output_writer.write_xml_file(content, xml_file, namespaces={"other": "urn:other"})
+
+        nfv_ns = "{urn:etsi:nfv:yang:etsi-nfv-descriptors}"
+        root = ElementTree.parse(xml_file).getroot()
+        self.assertEqual(root.tag, "{http://tail-f.com/ns/config/1.0}config")
+        vnfd = root.find("{0}nfv/{0}vnfd".format(nfv_ns))
+        self.assertEqual(vnfd.find(nfv_ns + "id").text, "vnfd <1>")
+        vdus = vnfd.findall(nfv_ns + "vdu")
+        self.assertEqual(len(vdus), 2)
+        self.assertIsNotNone(vdus[0].find("{http://cisco.com/ns/nso/cfp/cisco-etsi-nfvo}management"))
+        self.assertEqual(vdus[0].find(nfv_ns + "count").text, "0")
+        self.assertEqual(vdus[1].find("{urn:other}param/{urn:other}value").text, "true")
+
+    def test_xml_identity(self):
+        content = {"data": {"etsi-nfv-descriptors:nfv": {"vnfd": {
+            "cisco-etsi-nfvo-sol1-vnfd-extensions:additional-sol1-parameters": {
+                "layer-protocol": "etsi-nfv-descriptors:ipv4", "url": "http://host:80"}}}}}
+        f = io.BytesIO()
+        output_writer.write_xml(content, f)
+        xml = f.getvalue().decode("utf-8")
+        # The prefix of the identity is declared where it is used, other values with a ':' are left alone
+        self.assertIn('<layer-protocol xmlns:etsi-nfv-descriptors="urn:etsi:nfv:yang:etsi-nfv-descriptors">'
+                      'etsi-nfv-descriptors:ipv4</layer-protocol>', xml)
+        self.assertIn("<url>http://host:80</url>", xml)
+        params = ElementTree.fromstring(xml).find(
+            "{0}nfv/{0}vnfd/{{{1}}}additional-sol1-parameters".format(
+                "{urn:etsi:nfv:yang:etsi-nfv-descriptors}",
+                output_writer.XML_NAMESPACES["cisco-etsi-nfvo-sol1-vnfd-extensions"]))
+        self.assertIsNotNone(params)
+
+    def test_xml_unknown_module(self):
+        content = {"data": {"etsi-nfv-descriptors:nfv": {"vnfd": {"unknown-module:param": 1}}}}
+        xml_file = output_writer.xml_output_path(self.output)
+        with self.assertRaises(ValueError):
+            output_writer.write_xml_file(content, xml_file)
+        self.assertFalse(os.path.exists(xml_file))
+        output_writer.write_xml_file(content, xml_file, namespaces={"unknown-module": "urn:unknown"})
+        self.assertIsNotNone(ElementTree.parse(xml_file).getroot().find(".//{urn:unknown}param"))
@@ -0,0 +1,44 @@
+import unittest
+from keys.sol6_keys import PathMaping, PathResolver
+
+
+class TestPathResolver(unittest.TestCase):
+
+    def test_resolve_table(self):
+        table = {
+            "vnfd": "vnfd",
+            "vdu": ["vnfd", "vdu"],
+            "vdu_id": ["vdu", "id"],
+            "VALID_VAL": ["not", "a path"]
+        }
+        self.assertEqual(PathMaping.resolve_table(table), {
+            "vnfd": "vnfd",
+            "vdu": "vnfd;vdu",
+            "vdu_id": "vnfd;vdu;id",
+            "VALID_VAL": ["not", "a path"]
+        })
+
+    def test_resolved_once(self):
+        resolver = PathResolver({"a": "a", "b": ["a", "b"], "c": ["b", "c"]})
+        self.assertEqual(resolver.resolve("c"), "a;b;c")
+        self.assertEqual(resolver.resolved, {"a": "a", "b": "a;b", "c": "a;b;c"})
+
+    def test_deep_chain(self):
+        table = {"k0": "k0"}
+        for i in range(1, 5000):
+            table["k{}".format(i)] = ["k{}".format(i - 1), str(i)]
+        self.assertEqual(PathMaping.resolve_table(table)["k4999"].count(";"), 4999)
+
+    def test_missing_parent(self):
+        with self.assertLogs("keys.sol6_keys", level="ERROR") as logs:
+            resolved = PathMaping.resolve_table({"a": ["missing", "a"], "b": ["missing", "b"]})
+        self.assertEqual(resolved, {"a": ";a", "b": ";b"})
+        # Both are reported in one message
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("missing as a parent (of a, b)", logs.output[0])
+
+    def test_cycle(self):
+        with self.assertRaises(ValueError) as e:
+            PathMaping.resolve_table({"a": ["c", "a"], "b": ["a", "b"], "c": ["b", "c"], "d": ["x", "d"]})
+        self.assertIn("a -> c -> b -> a", str(e.exception))
+        self.assertIn("x as a parent", str(e.exception))
@@ -0,0 +1,222 @@
+import unittest
+import toml
+import yaml
+from solcon import SolCon
+from converters.sol6_converter import Sol6Converter, ConfigLookups
+from converters.sol6_converter_cisco import SOL6ConverterCisco
+from keys.sol6_keys_cisco import V2Map
+from mapping_plan import MappingPlan
+from mapping_v2 import MapElem
+from rule_stats import RuleStatsTable
+from sol6_config_default import SOL6ConfigDefault
+from valid_values import ValidValues
+
+
+def converter(tosca_vnf=None):
+    conv = SOL6ConverterCisco(tosca_vnf or {}, None, variables=toml.loads(SOL6ConfigDefault.config))
+    conv.vnfd = {}
+    return conv
+
+
+def options(*flags):
+    return MappingPlan(V2Map.FLAG_ATTRIBUTES).decode_flags(flags)
+
+
+class TestTransforms(unittest.TestCase):
+
+    def test_no_flags(self):
+        conv = converter({"b": {"c": "5 GB"}})
+        self.assertEqual(conv.get_transforms(options()), ())
+        self.assertEqual(conv.handle_flags("a", "b;c", options()), "5 GB")
+
+    def test_built_once(self):
+        conv = converter()
+        opts = options(V2Map.FLAG_ONLY_NUMBERS, V2Map.FLAG_MIN_1)
+        self.assertEqual(len(conv.get_transforms(opts)), 2)
+        self.assertIs(conv.get_transforms(opts), conv.get_transforms(options(V2Map.FLAG_ONLY_NUMBERS,
+                                                                             V2Map.FLAG_MIN_1)))
+
+    def test_shared_lookups(self):
+        variables = toml.loads(SOL6ConfigDefault.config)
+        lookups = ConfigLookups(variables)
+        first = SOL6ConverterCisco({}, None, variables=variables, lookups=lookups)
+        second = SOL6ConverterCisco({}, None, variables=variables, lookups=lookups)
+        opts = options(V2Map.FLAG_KEY_SET_VALUE, V2Map.FLAG_FORMAT_IP)
+        self.assertIs(first.get_transforms(opts), second.get_transforms(opts))
+        self.assertIs(first.get_valid_values("VALID_PROTOCOLS_VAL"), second.get_valid_values("VALID_PROTOCOLS_VAL"))
+        # The transforms use the converter they're called with
+        second.vnfd = {}
+        self.assertEqual(second.handle_flags("a", "x;IPV4", opts), ["etsi-nfv-descriptors:ipv4"])
+        # Other converter classes have their own transforms
+        base = Sol6Converter({}, None, variables=variables, lookups=lookups)
+        self.assertIsNot(base.get_transforms(opts), first.get_transforms(opts))
+
+    def test_variables_not_modified(self):
+        variables = {"tosca": {"a": "b"}, "sol6": {"c": "d"}}
+        conv = Sol6Converter({}, None, variables=variables)
+        conv.variables["tosca"]["vdu_identifier"] = ["type", "vdu"]
+        self.assertEqual(variables, {"tosca": {"a": "b"}, "sol6": {"c": "d"}})
+        self.assertIs(conv.variables["sol6"], variables["sol6"])
+
+    def test_order(self):
+        conv = converter()
+        opts = options(V2Map.FLAG_KEY_SET_VALUE, V2Map.FLAG_ONLY_NUMBERS, V2Map.FLAG_MIN_1)
+        self.assertEqual(conv.handle_flags("a", "vdu;c0", opts), 1)
+        self.assertEqual(conv.handle_flags("a", "vdu;c12", opts), 12)
+
+    def test_format_as_valid(self):
+        conv = converter()
+        self.assertEqual(conv.handle_flags("a", "x;IPV4", options(V2Map.FLAG_KEY_SET_VALUE, V2Map.FLAG_FORMAT_IP)),
+                         ["etsi-nfv-descriptors:ipv4"])
+        self.assertEqual(conv.handle_flags("a", "x;Root_Storage",
+                                           options(V2Map.FLAG_KEY_SET_VALUE, V2Map.FLAG_FORMAT_STORAGE_TYPE)),
+                         ["root-storage"])
+
+    def test_default_root(self):
+        conv = converter({"b": ""})
+        self.assertEqual(conv.handle_flags("a", "b", options(V2Map.FLAG_TYPE_ROOT_DEF)),
+                         conv.variables["sol6"]["VIRT_STORAGE_DEFAULT_VAL"])
+
+
+class TestFmtVal(unittest.TestCase):
+
+    def test_exact(self):
+        valid = ValidValues(["nfvi-node", "zone"])
+        self.assertEqual(Sol6Converter._fmt_val("NFVI_NODE", valid, False), (True, "nfvi-node"))
+        self.assertEqual(Sol6Converter._fmt_val("zon", valid, False), (False, "zon (INVALID)"))
+        self.assertEqual(Sol6Converter._fmt_val("zon", valid, True), (False, None))
+        self.assertEqual(Sol6Converter._fmt_val(3, valid, True), (False, "3 (INVALID)"))
+
+
+class TestRuleStats(unittest.TestCase):
+
+    def plan(self, mgmt=False):
+        vdus = [MapElem("c1", 0), MapElem("c2", 1), MapElem("c3", 2)]
+        plan = MappingPlan(V2Map.FLAG_ATTRIBUTES)
+        # Like the management rules V2Map only adds for some VNFDs, the rules after it move up an index
+        if mgmt:
+            plan.add((("vnf;mgmt", V2Map.FLAG_BLANK), "vnfd;mgmt-cp"))
+        plan.add((("vdus;{};name", V2Map.FLAG_BLANK), ["vnfd;vdu;{};name", vdus]))
+        plan.add((("vnf;id", V2Map.FLAG_BLANK), "vnfd;id"))
+        plan.add((("missing", V2Map.FLAG_BLANK), "vnfd;missing"))
+        plan.add(((None, V2Map.FLAG_BLANK), "vnfd;none"))
+        return plan
+
+    def run_plan(self, rule_stats=None, mgmt=False):
+        conv = converter({"vdus": {"c1": {"name": "a"}, "c2": {"name": ""}, "c3": {"name": 0}},
+                          "vnf": {"id": "v", "mgmt": "c1_nic0"}})
+        conv.rule_stats = rule_stats
+        conv.run_mapping(type("Keys", (), {"mapping": self.plan(mgmt)}))
+        return conv
+
+    def test_stats(self):
+        table = RuleStatsTable()
+        conv = self.run_plan(table)
+        self.assertEqual(conv.vnfd, self.run_plan().vnfd)
+        # The converter methods aren't replaced
+        self.assertNotIn("handle_flags", vars(conv))
+        self.assertNotIn("write_value", vars(conv))
+
+        stats = list(table.rules.values())
+        self.assertEqual((stats[0].elems, stats[0].writes, stats[0].skipped), (3, 2, 1))
+        self.assertEqual((stats[1].elems, stats[1].writes, stats[1].skipped), (1, 1, 0))
+        self.assertEqual((stats[3].elems, stats[3].writes, stats[3].runs), (0, 0, 1))
+        self.assertGreater(stats[0].seconds, stats[0].write_seconds)
+
+    def test_empty_plan(self):
+        table = RuleStatsTable()
+        conv = converter()
+        conv.rule_stats = table
+        conv.run_mapping(type("Keys", (), {"mapping": MappingPlan(V2Map.FLAG_ATTRIBUTES)}))
+        self.assertEqual(table.rules, {})
+        self.assertIsNone(conv.merge_cache)
+        self.assertEqual(table.table().splitlines()[-1], "0 rules, 0 never wrote a value")
+
+    def test_error_not_hidden(self):
+        table = RuleStatsTable()
+        conv = self.run_plan()
+        conv.rule_stats = table
+        conv.vnfd = None
+        with self.assertRaises(TypeError):
+            conv.run_mapping(type("Keys", (), {"mapping": self.plan()}))
+
+    def test_table(self):
+        table = RuleStatsTable()
+        self.run_plan(table)
+        self.run_plan(table)
+        first = next(iter(table.rules.values()))
+        self.assertEqual(first.runs, 2)
+        self.assertEqual(first.elems, 6)
+        self.assertEqual([s.index for s in table.sorted("elems")], [0, 1, 2, 3])
+        self.assertEqual([s["index"] for s in table.as_list("skipped")], [0, 1, 2, 3])
+        lines = table.table("index").splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertIn("vdus;{};name -> vnfd;vdu;{};name", lines[1])
+        self.assertEqual(lines[-1], "4 rules, 1 never wrote a value")
+        with self.assertRaises(ValueError):
+            table.sorted("name")
+
+    def test_different_plans(self):
+        table = RuleStatsTable()
+        self.run_plan(table)
+        self.run_plan(table, mgmt=True)
+        self.assertEqual(len(table.rules), 5)
+        for stats in table.rules.values():
+            self.assertEqual(stats.runs, 1 if stats.tosca_path == "vnf;mgmt" else 2, stats.tosca_path)
+        stats = {s.tosca_path: s for s in table.rules.values()}
+        self.assertEqual((stats["vdus;{};name"].index, stats["vdus;{};name"].elems, stats["vdus;{};name"].writes),
+                         (0, 6, 4))
+        self.assertEqual((stats["vnf;id"].elems, stats["vnf;id"].writes), (2, 2))
+        self.assertEqual(table.table().splitlines()[-1], "5 rules, 1 never wrote a value")
+
+
+class TestFindProvider(unittest.TestCase):
+
+    def test_file_order(self):
+        tosca = yaml.safe_load("""
+metadata:
+  provider: Cisco Systems
+topology_template:
+  node_templates:
+    vnf:
+      properties:
+        provider: mavenir
+""")
+        self.assertEqual(Sol6Converter.find_provider(tosca), "cisco systems")
+        self.assertEqual(SolCon.find_provider(None, tosca, {"cisco": None, "mavenir": None}), "cisco")
+        self.assertEqual(SolCon.find_provider("mavenir", tosca, {"cisco": None, "mavenir": None}), "mavenir")
+
+    def test_skips_definitions(self):
+        tosca = yaml.safe_load("""
+node_types:
+  cisco.test:
+    properties:
+      provider:
+        type: string
+        default: other
+      flavors:
+        - provider:
+            type: string
+topology_template:
+  node_templates:
+    vnf:
+      properties:
+        provider: " Mavenir "
+""")
+        self.assertEqual(Sol6Converter.find_provider(tosca), "mavenir")
+
+    def test_missing(self):
+        tosca = yaml.safe_load("""
+node_types:
+  cisco.test:
+    properties:
+      provider:
+        type: string
+topology_template:
+  node_templates:
+    vnf:
+      properties:
+        provider: null
+""")
+        with self.assertRaises(ValueError):
+            Sol6Converter.find_provider(tosca)
@@ -0,0 +1,64 @@
+import os
+import json
+import pstats
+import tempfile
+import unittest
+from stage_profiler import StageProfiler, NULL_PROFILER
+
+
+class TestStageProfiler(unittest.TestCase):
+
+    def run_stages(self, profiler):
+        profiler.start()
+        for _ in range(2):
+            with profiler.stage("first"):
+                pass
+        with profiler.stage("output"):
+            with profiler.stage("prune"):
+                data = [bytearray(256 * 1024)]
+            with profiler.stage("serialize"):
+                del data
+        profiler.stop()
+
+    def test_stages(self):
+        profiler = StageProfiler()
+        self.run_stages(profiler)
+        self.assertEqual(list(profiler.stages.keys()), ["first", "output", "output.prune", "output.serialize"])
+        self.assertEqual(profiler.stages["first"].calls, 2)
+        self.assertEqual(profiler.stages["output"].calls, 1)
+        self.assertGreaterEqual(profiler.total_seconds, profiler.stages["output"].seconds)
+
+    def test_peak_memory(self):
+        profiler = StageProfiler()
+        self.run_stages(profiler)
+        prune = profiler.stages["output.prune"].peak_memory
+        self.assertGreaterEqual(prune, 256 * 1024)
+        # The peak of a stage includes the peaks of the stages it ran
+        self.assertGreaterEqual(profiler.stages["output"].peak_memory, prune)
+        self.assertLess(profiler.stages["output.serialize"].peak_memory, prune)
+
+    def test_no_memory(self):
+        profiler = StageProfiler(trace_memory=False)
+        self.run_stages(profiler)
+        self.assertIsNone(profiler.stages["first"].peak_memory)
+        self.assertTrue(profiler.summary().splitlines()[1].endswith(" -"))
+
+    def test_disabled(self):
+        self.run_stages(NULL_PROFILER)
+        self.assertEqual(NULL_PROFILER.stages, {})
+
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            report_file = os.path.join(tmp, "timings.json")
+            profile_file = os.path.join(tmp, "run.pstats")
+            profiler = StageProfiler(profile_file=profile_file)
+            self.run_stages(profiler)
+            profiler.write_report(report_file, file="vnfd.yaml")
+
+            with open(report_file) as f:
+                report = json.load(f)
+            self.assertEqual(report["file"], "vnfd.yaml")
+            self.assertEqual([s["name"] for s in report["stages"]],
+                             ["first", "output", "output.prune", "output.serialize"])
+            self.assertEqual(report["stages"][0]["calls"], 2)
+            self.assertTrue(pstats.Stats(profile_file).total_calls > 0)
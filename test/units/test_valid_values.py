@@ -0,0 +1,28 @@
+import unittest
+from valid_values import ValidValues
+
+
+class TestValidValues(unittest.TestCase):
+
+    def test_lookup(self):
+        valid = ValidValues(["Zone_Group", "zone-group", "ZONE"])
+        self.assertEqual(valid.lookup, {"zone-group": "Zone_Group", "zone": "ZONE"})
+        self.assertEqual(valid.options, ["Zone_Group", "zone-group", "ZONE"])
+
+    def test_exact(self):
+        valid = ValidValues(["nfvi-node", "zone"])
+        self.assertEqual(valid.match("NFVI_Node"), "nfvi-node")
+        self.assertIsNone(valid.match("zon"))
+
+    def test_fuzzy_first_wins(self):
+        options = ["zone-group", "zone"]
+        self.assertEqual(ValidValues(options, fuzzy=True).match("zone"), "zone-group")
+        self.assertEqual(ValidValues(options).match("zone"), "zone")
+        self.assertEqual(ValidValues(["root-storage"], fuzzy=True).match("root"), "root-storage")
+
+    def test_cached(self):
+        valid = ValidValues(["ephemeral-storage", "root-storage"], fuzzy=True)
+        self.assertEqual(valid.match("Root"), "root-storage")
+        self.assertIsNone(valid.match("volume"))
+        self.assertEqual(valid._matches, {"Root": "root-storage", "volume": None})
+        self.assertIsNone(valid.match("volume"))